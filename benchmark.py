@@ -0,0 +1,257 @@
+import argparse
+import json
+import numpy as np
+import sys
+import time
+import tracemalloc
+
+from game_env import GameEnvironment
+from strategies import bitboard
+from strategies.factory import STRATEGIES, create_strategy
+
+
+MOVES = ['left', 'right', 'up', 'down']
+CANONICAL_SUFFIX = '[canonical]'
+
+
+def build_corpus(seed=0, games=4, stride=5, size=200):
+    # Positions from real (shallow-search) games, so every hot path sees the
+    # same mix of early, mid and late boards on every run.
+    player = create_strategy('simple', debug=False, tt_size_mb=0)
+    corpus = []
+
+    for game in range(games):
+        env = GameEnvironment(seed=seed + game)
+
+        while not env.is_game_over():
+            board = env.get_board()
+            if env.get_move_count() % stride == 0:
+                corpus.append(board)
+
+            _, direction = player.find_best_move(board, depth=1)
+            if not env.move(direction):
+                break
+
+    step = max(1, len(corpus) // size)
+    return corpus[::step][:size]
+
+
+def _measure(func, items, repeats, strategy=None, boards_per_item=1):
+    timings = []
+    nodes = 0
+
+    for _ in range(repeats):
+        if strategy is not None:
+            # Start every pass from an empty transposition table so passes do the same work.
+            strategy.new_game()
+            strategy.pop_search_stats()
+
+        start = time.perf_counter_ns()
+        for item in items:
+            func(item)
+        timings.append(time.perf_counter_ns() - start)
+
+        if strategy is not None:
+            stats = strategy.pop_search_stats()
+            nodes = stats.get('search_nodes', 0)
+
+    if strategy is not None:
+        strategy.new_game()
+
+    tracemalloc.start()
+    for item in items:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    result = {
+        'ops': len(items) * boards_per_item,
+        'ns_per_op': best / (len(items) * boards_per_item),
+        'peak_alloc_bytes': peak
+    }
+    if strategy is not None:
+        result['nodes'] = nodes
+        result['nodes_per_sec'] = nodes / (best / 1e9) if best > 0 else 0.0
+        if 'tt_hit_rate' in stats:
+            result['tt_hit_rate'] = stats['tt_hit_rate']
+        if stats.get('eval_cache_hits') or stats.get('eval_cache_misses'):
+            result['eval_cache_hit_rate'] = stats['eval_cache_hits'] / (
+                stats['eval_cache_hits'] + stats['eval_cache_misses'])
+        strategy.pop_search_stats()
+
+    return result
+
+
+def run_benchmarks(corpus, strategies, repeats=5, name_filter=None, weights_path=None):
+    packed = [bitboard.to_bitboard(board) for board in corpus]
+    search_boards = corpus[::len(corpus) // 20 or 1][:20]
+    root_boards = corpus[::len(corpus) // 10 or 1][:10]
+
+    base = create_strategy('simple', debug=False, tt_size_mb=0)
+    benchmarks = [
+        ('bitboard.move', lambda b: [bitboard.move(b, move) for move in MOVES], packed, None, 1),
+        ('simulate_move', lambda b: [base.simulate_move(b, move) for move in MOVES], corpus, None, 1),
+        ('is_game_over', base.is_game_over, corpus, None, 1),
+    ]
+
+    for name in strategies:
+        try:
+            strategy = create_strategy(name, weights_path=weights_path, debug=False, seed=0)
+        except FileNotFoundError as e:
+            print(f'Skipping {name}: {e}')
+            continue
+
+        # Playout strategies have no cheap static evaluation or tree to time.
+        # Star strategies search through _star, not the inherited _expectimax.
+        if hasattr(strategy, '_star'):
+            benchmarks += [
+                (f'{name}.evaluate_position', strategy.evaluate_position, corpus, None, 1),
+                (f'{name}._star',
+                 lambda b, s=strategy: s._star(bitboard.to_bitboard(b), 2, True, 1.0, -float('inf')),
+                 search_boards, strategy, 1),
+            ]
+        elif hasattr(strategy, '_expectimax'):
+            benchmarks += [
+                (f'{name}.evaluate_position', strategy.evaluate_position, corpus, None, 1),
+                (f'{name}._expectimax', lambda b, s=strategy: s._expectimax(bitboard.to_bitboard(b), 2, True),
+                 search_boards, strategy, 1),
+            ]
+        benchmarks.append(
+            (f'{name}.find_best_move', lambda b, s=strategy: s.find_best_move(b, depth=3), root_boards, strategy, 1))
+
+        # The whole root set as one batch, reported per board.
+        if hasattr(strategy, '_search_many'):
+            benchmarks.append(
+                (f'{name}.find_best_moves', lambda b, s=strategy: s.find_best_moves(b, depth=3),
+                 [np.array(root_boards)], strategy, len(root_boards)))
+
+        # Symmetric evaluations are searched again with canonical cache keys.
+        if getattr(strategy, 'SYMMETRIC_EVALUATION', False):
+            canonical = create_strategy(name, weights_path=weights_path, debug=False, canonical_keys=True)
+            benchmarks += [
+                (f'{name}.find_best_move{CANONICAL_SUFFIX}',
+                 lambda b, s=canonical: s.find_best_move(b, depth=3), root_boards, canonical, 1),
+                (f'{name}.find_best_moves{CANONICAL_SUFFIX}',
+                 lambda b, s=canonical: s.find_best_moves(b, depth=3),
+                 [np.array(root_boards)], canonical, len(root_boards)),
+            ]
+
+    results = {}
+    for name, func, items, strategy, boards_per_item in benchmarks:
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = _measure(func, items, repeats, strategy, boards_per_item)
+
+    return results
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        change = (result['ns_per_op'] / baseline[name]['ns_per_op'] - 1) * 100
+        result['change_pct'] = change
+
+        if change > max_regression:
+            regressions.append(name)
+
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<32} {'ns/op':>14} {'peak alloc':>12} {'nodes/sec':>12} {'vs base':>9}")
+
+    for name, result in results.items():
+        nodes_per_sec = f"{result['nodes_per_sec']:.0f}" if 'nodes_per_sec' in result else '-'
+        change = f"{result['change_pct']:+.1f}%" if 'change_pct' in result else '-'
+        print(
+            f"{name:<32} {result['ns_per_op']:>14.0f} {result['peak_alloc_bytes']:>12} "
+            f"{nodes_per_sec:>12} {change:>9}"
+        )
+
+
+def print_symmetry_report(results):
+    lines = []
+    for name, result in results.items():
+        if not name.endswith(CANONICAL_SUFFIX) or name[:-len(CANONICAL_SUFFIX)] not in results:
+            continue
+
+        base = results[name[:-len(CANONICAL_SUFFIX)]]
+        hit_rate = 'tt_hit_rate' if 'tt_hit_rate' in result else 'eval_cache_hit_rate'
+        hits = [
+            f"{data[hit_rate] * 100:.1f}%" if hit_rate in data else '-'
+            for data in (base, result)
+        ]
+        lines.append(
+            f"{name[:-len(CANONICAL_SUFFIX)]:<32} {base['ns_per_op'] / result['ns_per_op']:>7.2f}x "
+            f"{hit_rate:>20} {hits[0]:>7} -> {hits[1]}")
+
+    if lines:
+        print(f"\n{'canonical keys':<32} {'speedup':>8} {'cache':>20} hit rate")
+        print('\n'.join(lines))
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {number}')
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for engine, evaluation and search')
+    parser.add_argument(
+        '-s', '--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES),
+        help='Strategies to benchmark (default: all)')
+    parser.add_argument(
+        '-r', '--repeats', type=_positive_int, default=5,
+        help='Timed passes per benchmark, the fastest one is reported (default: 5)')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed of the games the position corpus is taken from (default: 0)')
+    parser.add_argument(
+        '-k', '--filter', default=None,
+        help='Only run benchmarks whose name contains this text')
+    parser.add_argument(
+        '--baseline', default=None,
+        help='Baseline JSON file to compare against')
+    parser.add_argument(
+        '--save-baseline', default=None,
+        help='Write the results to this JSON file')
+    parser.add_argument(
+        '--max-regression', type=float, default=10.0,
+        help='Fail when ns/op grows by more than this percentage over the baseline (default: 10)')
+    parser.add_argument(
+        '--weights', default=None,
+        help='Weights file for trained strategies (default: ntuple_weights.npy)')
+
+    args = parser.parse_args()
+
+    corpus = build_corpus(seed=args.seed)
+    results = run_benchmarks(
+        corpus, args.strategies, repeats=args.repeats, name_filter=args.filter, weights_path=args.weights)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+
+    print_results(results)
+    print_symmetry_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nBaseline saved to: {args.save_baseline}')
+
+    if regressions:
+        print(f"\nREGRESSION over {args.max_regression:.1f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
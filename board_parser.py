@@ -1,4 +1,5 @@
 import cv2
+import hashlib
 import json
 import numpy as np
 import os
@@ -6,6 +7,18 @@ import time
 
 from datetime import datetime
 from PIL import ImageGrab
+from strategies import bitboard
+
+
+# A cell brighter than this on average is empty; a color farther than this
+# from every calibrated tile color is not a tile.
+EMPTY_BRIGHTNESS = 240
+MAX_COLOR_DISTANCE = 40
+
+# Quantization levels per channel of the color lookup table, and the file it
+# is cached in next to the calibration.
+COLOR_LUT_LEVELS = 64
+COLOR_LUT_FILE = 'calibration_lut.npz'
 
 
 class BoardParser:
@@ -22,6 +35,13 @@ class BoardParser:
         self._gap_y = None
         self._tile_positions = None
 
+        self._row_bands = None
+        self._column_bounds = None
+        self._band_dtype = None
+        self._color_matrix = None
+        self._color_exponents = None
+        self._color_lut = None
+
         self._debug_dir = os.path.join(calibration_dir, 'debug')
         if debug and not os.path.exists(self._debug_dir):
             os.makedirs(self._debug_dir)
@@ -68,6 +88,8 @@ class BoardParser:
                 self._gap_y = grid_params['gap_y']
                 self._tile_positions = grid_params['tile_positions']
 
+            self._build_classification_tables()
+
             if self._debug:
                 print('Calibration data loaded successfully')
                 if self._tile_positions:
@@ -80,6 +102,34 @@ class BoardParser:
         except Exception as e:
             raise Exception(f'Error loading calibration data: {e}')
 
+    def _build_classification_tables(self):
+        # The calibrated colors as one matrix, and the integer bounds of the
+        # center regions in the scaled board image: one row band per grid row
+        # and the column bounds of every grid column, with the same 10% margins
+        # as the calibration samples.
+        self._color_matrix = np.array(
+            [color_data['average'] for color_data in self._tile_colors.values()], dtype=np.float64).reshape(-1, 3)
+        self._color_exponents = np.array(
+            [bitboard.tile_exponent(value) for value in self._tile_colors], dtype=np.uint8)
+        self._color_lut = self._load_color_lut()
+
+        if not self._tile_positions:
+            return
+
+        cells = (np.array(self._tile_positions, dtype=np.float64) * self._scale_factor).astype(np.int64)
+
+        top, bottom = cells[:, 0, 1], cells[:, 0, 3]
+        margin_h = ((bottom - top) * 0.1).astype(np.int64)
+        self._row_bands = np.stack([top + margin_h, bottom - margin_h], axis=1)
+
+        left, right = cells[0, :, 0], cells[0, :, 2]
+        margin_w = ((right - left) * 0.1).astype(np.int64)
+        self._column_bounds = np.stack([left + margin_w, right - margin_w], axis=1)
+
+        # Column sums of a band fit in 16 bits up to 257 rows of 255.
+        band_height = int((self._row_bands[:, 1] - self._row_bands[:, 0]).max())
+        self._band_dtype = np.uint16 if band_height * 255 <= np.iinfo(np.uint16).max else np.uint32
+
     def countdown_timer(self, seconds):
         print(f'Starting in {seconds} seconds... Switch to the game window!')
         for i in range(seconds, 0, -1):
@@ -177,72 +227,119 @@ class BoardParser:
             except Exception as e:
                 print(f'Failed to save game board screenshot: {e}')
 
-    def recognize_tile_value(self, cell_image, position=None):
-        h, w = cell_image.shape[:2]
-        margin_h = int(h * 0.1)
-        margin_w = int(w * 0.1)
-        center_region = cell_image[margin_h:h-margin_h, margin_w:w-margin_w]
+    def capture_board(self):
+        if not self._board_region:
+            raise ValueError('Game board region is not set!')
 
-        avg_color = np.mean(center_region, axis=(0, 1))
+        if not self._tile_positions:
+            raise ValueError('Tile grid parameters are not set! Run calibration first.')
 
-        if np.mean(avg_color) > 240:
-            return 0
+        return self.get_screenshot(self._board_region)
 
-        best_match = 0
-        min_distance = float('inf')
+    def cell_colors(self, board_img):
+        # Mean BGR color of the 16 center regions: every row band is summed
+        # over its rows, and a running sum along the columns gives each
+        # region's total from two lookups.
+        height, width = board_img.shape[:2]
+        rows = board_img.reshape(height, width * 3)
 
-        for value, color_data in self._tile_colors.items():
-            if value == 0:
-                continue
+        bands = np.stack([
+            rows[start:stop].sum(axis=0, dtype=self._band_dtype) for start, stop in self._row_bands
+        ]).reshape(4, width, 3)
 
-            target_color = np.array(color_data['average'])
-            distance = np.linalg.norm(avg_color - target_color)
+        running = np.zeros((4, width + 1, 3), dtype=np.uint64)
+        np.cumsum(bands, axis=1, dtype=np.uint64, out=running[:, 1:])
 
-            if distance < min_distance:
-                min_distance = distance
-                best_match = value
+        starts, stops = self._column_bounds[:, 0], self._column_bounds[:, 1]
+        sums = running[:, stops] - running[:, starts]
 
-        threshold = 40
+        areas = np.outer(self._row_bands[:, 1] - self._row_bands[:, 0], stops - starts)
+        return sums / areas[:, :, np.newaxis]
 
-        if min_distance > threshold:
-            if self._debug and position:
-                print(f'Cell {position}: no good match (min distance {min_distance}), returning 0')
-            return 0
+    def _load_color_lut(self):
+        # Tile exponent for every quantized BGR color, with the empty and
+        # distance rules already applied. It only depends on the calibrated
+        # colors, so it is cached on disk under a hash of them.
+        key = hashlib.sha1(json.dumps(
+            [self._tile_colors, COLOR_LUT_LEVELS, EMPTY_BRIGHTNESS, MAX_COLOR_DISTANCE], sort_keys=True
+        ).encode()).hexdigest()
+        filepath = os.path.join(self._calibration_dir, COLOR_LUT_FILE)
 
-        if self._debug and position:
-            print(f'Cell {position}: recognized as {best_match} (distance {min_distance})')
+        try:
+            with np.load(filepath) as cached:
+                if str(cached['key']) == key:
+                    return cached['lut']
+        except (OSError, KeyError, ValueError):
+            pass
 
-        return best_match
+        start_time = time.time()
 
-    def parse_board(self):
-        if not self._board_region:
-            raise ValueError('Game board region is not set!')
+        # Every cell of the table holds the class of the center of its bin.
+        step = 256 // COLOR_LUT_LEVELS
+        centers = np.arange(COLOR_LUT_LEVELS) * step + (step - 1) / 2
+        grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
 
-        if not self._tile_positions:
-            raise ValueError('Tile grid parameters are not set! Run calibration first.')
+        lut = np.concatenate([
+            self.match_colors(grid[start:start + 65536])[0] for start in range(0, len(grid), 65536)
+        ]).reshape(COLOR_LUT_LEVELS, COLOR_LUT_LEVELS, COLOR_LUT_LEVELS)
 
-        start_time = time.time()
+        try:
+            np.savez(filepath, lut=lut, key=key)
+        except OSError as e:
+            print(f'Failed to cache color lookup table: {e}')
 
-        board_img = self.get_screenshot(self._board_region)
-        board = np.zeros((4, 4), dtype=int)
+        if self._debug:
+            print(f'Color lookup table built in {time.time() - start_time:.3f} sec: {filepath}')
 
-        for i in range(4):
-            for j in range(4):
-                tile_left, tile_top, tile_right, tile_bottom = self._tile_positions[i][j]
+        return lut
+
+    def match_colors(self, colors):
+        # Nearest calibrated color for an (N, 3) array of mean colors: cells
+        # brighter than EMPTY_BRIGHTNESS are empty, and so are cells farther
+        # than MAX_COLOR_DISTANCE from every color. Distances come from one
+        # broadcast and the first nearest color wins. Returns the tile
+        # exponents and the distances to the nearest color.
+        colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+        exponents = np.zeros(len(colors), dtype=np.uint8)
+        if not len(self._color_matrix):
+            return exponents, np.full(len(colors), np.inf)
 
-                scaled_left = int(tile_left * self._scale_factor)
-                scaled_top = int(tile_top * self._scale_factor)
-                scaled_right = int(tile_right * self._scale_factor)
-                scaled_bottom = int(tile_bottom * self._scale_factor)
+        distances = np.linalg.norm(colors[:, np.newaxis, :] - self._color_matrix[np.newaxis, :, :], axis=2)
+        nearest = distances.argmin(axis=1)
+        min_distances = distances[np.arange(len(colors)), nearest]
+
+        matched = (colors.mean(axis=1) <= EMPTY_BRIGHTNESS) & (min_distances <= MAX_COLOR_DISTANCE)
+        exponents[matched] = self._color_exponents[nearest[matched]]
+
+        return exponents, min_distances
+
+    def classify_colors(self, colors):
+        # One lookup per cell in the quantized color table.
+        bins = np.minimum(colors.reshape(16, 3) * (COLOR_LUT_LEVELS / 256), COLOR_LUT_LEVELS - 1).astype(np.intp)
+        board = self._color_lut[bins[:, 0], bins[:, 1], bins[:, 2]]
+
+        if self._debug:
+            _, distances = self.match_colors(colors)
+            for k in range(16):
+                print(f'Cell {divmod(k, 4)}: recognized as {bitboard.tile_value(board[k])} '
+                      f'(distance {distances[k]})')
+
+        return board.reshape(4, 4)
+
+    def classify_board(self, board_img):
+        return self.classify_colors(self.cell_colors(board_img))
+
+    def parse_board(self):
+        start_time = time.time()
 
-                cell_img = board_img[scaled_top:scaled_bottom, scaled_left:scaled_right]
-                board[i, j] = self.recognize_tile_value(cell_img, (i, j))
+        board = self.classify_board(self.capture_board())
 
         parse_time = time.time() - start_time
 
         return board, parse_time
 
     def print_board_text(self, board):
+        board = bitboard.decode_board(board)
         print('+' + '------+' * 4)
         for i in range(4):
             row_str = '|'
@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from datetime import datetime
+from strategies.factory import STRATEGIES, create_strategy
+from strategies.opening_book import build_book, save_book
+
+
+DEFAULT_BOOK_PATH = 'opening_book.npz'
+
+# Strategies that search with find_best_move and can use a book.
+BOOK_STRATEGIES = [name for name, strategy in STRATEGIES.items() if hasattr(strategy, 'cache_fingerprint')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book by deep offline searches')
+    parser.add_argument(
+        '-s', '--strategy', choices=BOOK_STRATEGIES, default='simple',
+        help='Strategy the book is built for (default: simple)')
+    parser.add_argument(
+        '-m', '--moves', type=int, default=3,
+        help='Moves from the start of a game covered by the book (default: 3)')
+    parser.add_argument(
+        '-d', '--depth', type=int, default=5,
+        help='Search depth of every book move (default: 5)')
+    parser.add_argument(
+        '--min-prob', type=float, default=1e-6,
+        help='Boards less likely than this to be reached are left out (default: 1e-6)')
+    parser.add_argument(
+        '--prob-cutoff', type=float, default=0.02,
+        help='Spawn path probability cutoff, must match the one used in play (default: 0.02)')
+    parser.add_argument(
+        '--weights', default=None,
+        help='Weights file for trained strategies (default: ntuple_weights.npy)')
+    parser.add_argument(
+        '-o', '--output', default=DEFAULT_BOOK_PATH,
+        help=f'Book file (default: {DEFAULT_BOOK_PATH})')
+
+    args = parser.parse_args()
+
+    print(f'=== OPENING BOOK ({datetime.now()}) ===')
+    print(f'Strategy: {args.strategy} | Moves: {args.moves} | Depth: {args.depth}')
+
+    strategy = create_strategy(
+        args.strategy, debug=False, prob_cutoff=args.prob_cutoff, weights_path=args.weights)
+    start_time = time.perf_counter()
+
+    def progress(move, positions):
+        print(f'Move {move}: {positions} boards searched ({time.perf_counter() - start_time:.1f}s)')
+
+    book = build_book(strategy, moves=args.moves, depth=args.depth, min_prob=args.min_prob, progress=progress)
+    save_book(args.output, book)
+    strategy.close()
+
+    print(f"Book saved to: {args.output} ({len(book['boards'])} boards)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import random
+
+from strategies import bitboard
+
+
+class GameEnvironment:
+    # Software copy of the emulator game: moves use the same bitboard tables as
+    # the strategies, new tiles are 2 (90%) or 4 (10%) on a random empty cell.
+    def __init__(self, seed=None, four_probability=0.1, start_tiles=2):
+        self._rng = random.Random(seed)
+        self._four_probability = four_probability
+        self._start_tiles = start_tiles
+
+        self._board = 0
+        self._move_count = 0
+
+        self.reset()
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self._rng.seed(seed)
+
+        self._board = 0
+        self._move_count = 0
+
+        for _ in range(self._start_tiles):
+            self._spawn_tile()
+
+        return self.get_board()
+
+    def _spawn_tile(self):
+        empty_cells = bitboard.get_empty_cells(self._board)
+        if not empty_cells:
+            return False
+
+        i, j = self._rng.choice(empty_cells)
+        exponent = 2 if self._rng.random() < self._four_probability else 1
+        self._board = bitboard.place_tile(self._board, i, j, exponent)
+
+        return True
+
+    def get_board(self):
+        return bitboard.from_bitboard(self._board)
+
+    def get_bitboard(self):
+        return self._board
+
+    def get_move_count(self):
+        return self._move_count
+
+    def move(self, direction):
+        new_board = bitboard.move(self._board, direction)
+
+        if new_board == self._board:
+            return False
+
+        self._board = new_board
+        self._move_count += 1
+        self._spawn_tile()
+
+        return True
+
+    def is_game_over(self):
+        return bitboard.is_game_over(self._board)
+
+    def get_max_tile(self):
+        return bitboard.tile_value(bitboard.get_max_exponent(self._board))
@@ -1,10 +1,8 @@
 import argparse
 
-from board_parser import BoardParser
-from calibration import Calibrator
+from game_env import GameEnvironment
 from solver import Solver
-from strategies.simple_strategy import SimpleStrategy
-from strategies.improved_strategy import ImprovedStrategy
+from strategies.factory import STRATEGIES, create_strategy
 
 
 def main():
@@ -16,7 +14,7 @@ def main():
     parser.add_argument(
         '-d', '--debug', action='store_true', help='Enable debug output')
     parser.add_argument(
-        '-s', '--strategy', choices=['simple', 'improved', 'advanced', 'star', 'expectimax', 'd'], default='simple',
+        '-s', '--strategy', choices=list(STRATEGIES), default='simple',
         help='Strategy to use (default: simple)')
     parser.add_argument(
         '-g', '--games', type=int, default=None,
@@ -30,27 +28,89 @@ def main():
     parser.add_argument(
         '--profile', action='store_true',
         help='Enable performance profiling and statistics')
+    parser.add_argument(
+        '--tt-size', type=float, default=64,
+        help='Transposition table memory budget in MB, 0 disables it (default: 64)')
+    parser.add_argument(
+        '--prob-cutoff', type=float, default=0.02,
+        help='Spawn path probability below which chance nodes are evaluated statically (default: 0.02)')
+    parser.add_argument(
+        '--time-budget', type=float, default=None,
+        help='Search time per move in seconds using iterative deepening (default: fixed depth)')
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help='Worker processes for parallel root search, 0 searches serially (default: 0)')
+    parser.add_argument(
+        '--batch-search', action='store_true',
+        help='Search the whole tree as NumPy arrays with batched leaf evaluation')
+    parser.add_argument(
+        '--canonical-keys', action='store_true',
+        help='Key search caches on the canonical board under rotations and reflections (ntuple only)')
+    parser.add_argument(
+        '--move-cache', default=None,
+        help='SQLite file caching search results across runs and processes (default: off)')
+    parser.add_argument(
+        '--move-cache-size', type=int, default=1000000,
+        help='Most results kept in the move cache, least recently used go first (default: 1000000)')
+    parser.add_argument(
+        '--ponder', action='store_true',
+        help='Search every spawn outcome of the next board in the background during move animations')
+    parser.add_argument(
+        '--prefetch', action='store_true',
+        help='Send the next move without reading the board when every spawn outcome leads to it')
+    parser.add_argument(
+        '--pipeline', action='store_true',
+        help='Run capture, classification, search and key input as threaded stages linked by queues')
+    parser.add_argument(
+        '--opening-book', default=None,
+        help='Opening book from build_opening_book.py, consulted before searching (default: off)')
+    parser.add_argument(
+        '--headless', action='store_true',
+        help='Play in the built-in game simulator instead of the emulator')
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Random seed for tile spawns in headless mode and montecarlo playouts (default: random)')
+    parser.add_argument(
+        '--weights', default=None,
+        help='Weights file for the ntuple strategy (default: ntuple_weights.npy)')
+    parser.add_argument(
+        '--playouts', type=int, default=100,
+        help='Playouts per root move for the montecarlo strategy (default: 100)')
+    parser.add_argument(
+        '--playout-policy', choices=['random', 'greedy'], default='random',
+        help='Move choice inside montecarlo playouts (default: random)')
 
     args = parser.parse_args()
 
+    # The screen capture and vision modules are imported only when used, so
+    # headless runs work without OpenCV or a display.
     if args.calibrate:
+        from calibration import Calibrator
         Calibrator().calibrate()
     elif args.parse:
+        from board_parser import BoardParser
         try:
             BoardParser(debug=True, calibration_dir='./').parse_board_state()
         except Exception as e:
             print(f'Parsing error: {e}')
     else:
-        if args.strategy == 'simple':
-            strategy = SimpleStrategy(debug=args.debug, enable_profiling=args.profile)
-        elif args.strategy == 'improved':
-            strategy = ImprovedStrategy(debug=args.debug)
+        strategy = create_strategy(
+            args.strategy, weights_path=args.weights, debug=args.debug, tt_size_mb=args.tt_size,
+            prob_cutoff=args.prob_cutoff, workers=args.workers, batch_search=args.batch_search,
+            canonical_keys=args.canonical_keys, move_cache_path=args.move_cache,
+            move_cache_entries=args.move_cache_size, opening_book_path=args.opening_book,
+            playouts=args.playouts, playout_policy=args.playout_policy, seed=args.seed)
 
         solver = Solver(
             strategy=strategy,
             debug=args.debug,
             pause_on_double_2048=args.pause_on_double_2048,
-            enable_profiling=args.profile
+            enable_profiling=args.profile,
+            time_budget=args.time_budget,
+            environment=GameEnvironment(seed=args.seed) if args.headless else None,
+            ponder=args.ponder,
+            prefetch=args.prefetch,
+            pipeline=args.pipeline
         )
         solver.play(target_score=args.target, max_games=args.games)
 
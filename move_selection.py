@@ -0,0 +1,11 @@
+# Move selection rules of the Solver game loop, shared with self_play.py so
+# offline games pick depths and aggressive moves the same way. Neither file
+# imports the other: the Solver needs the screen capture dependencies.
+
+
+def get_search_depth(free_cells):
+    return 3 if free_cells <= 4 else 2
+
+
+def is_aggressive_position(free_cells, max_tile):
+    return free_cells <= 3 and max_tile >= 48
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+
+
+_STOP = object()
+
+
+class Stage:
+    # One worker thread between two queues. Time from taking an item to handing
+    # on its result counts as busy, so busy time over wall time is the stage
+    # occupancy. Errors go to the `errors` queue (by default the outbox, so
+    # they travel down the pipeline like results) for the solver to raise.
+    def __init__(self, name, function, inbox, outbox, errors=None):
+        self.name = name
+        self._function = function
+        self._inbox = inbox
+        self._outbox = outbox
+        self._errors = errors if errors is not None else outbox
+        self._busy_time = 0.0
+        self._thread = threading.Thread(target=self._run, name=f'pipeline-{name}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._inbox.get()
+            if item is _STOP:
+                return
+
+            start_time = time.perf_counter()
+            if isinstance(item, Exception):
+                result = item
+            else:
+                try:
+                    result = self._function(item)
+                except Exception as e:
+                    result = e
+            self._busy_time += time.perf_counter() - start_time
+
+            if isinstance(result, Exception):
+                self._errors.put(result)
+            elif self._outbox is not None and result is not None:
+                self._outbox.put(result)
+
+    def pop_busy_time(self):
+        busy_time = self._busy_time
+        self._busy_time -= busy_time
+        return busy_time
+
+    def stop(self):
+        self._inbox.put(_STOP)
+        self._thread.join()
+
+
+class Pipeline:
+    # Capture, classification and key input run on their own threads, linked
+    # by queues; the solver thread is the search stage in between. Sending
+    # moves queues a capture right after the last key press, so the frame
+    # taken after a move is the next board the search gets.
+    QUEUES = ['requests', 'frames', 'boards', 'moves']
+
+    def __init__(self, capture, classify, make_move, board_timeout=10.0):
+        self._make_move = make_move
+        self._board_timeout = board_timeout
+        self._queues = {name: queue.Queue() for name in self.QUEUES}
+
+        self._stages = [
+            Stage('capture', lambda _: capture(), self._queues['requests'], self._queues['frames']),
+            Stage('classify', classify, self._queues['frames'], self._queues['boards']),
+            # A failed key press queues no capture: its error takes the place of the board.
+            Stage('input', self._send, self._queues['moves'], None, errors=self._queues['boards'])
+        ]
+        for stage in self._stages:
+            stage.start()
+
+        self._stats_start = time.perf_counter()
+        self._wait_time = 0.0
+        self._depths = {name: [] for name in self.QUEUES}
+
+    def _send(self, directions):
+        for direction in directions:
+            self._make_move(direction)
+        self._queues['requests'].put(True)
+
+    def request_board(self):
+        self._queues['requests'].put(True)
+
+    def send_moves(self, directions):
+        self._queues['moves'].put(list(directions))
+
+    def next_board(self):
+        for name, pending in self._queues.items():
+            self._depths[name].append(pending.qsize())
+
+        wait_start = time.perf_counter()
+        try:
+            board = self._queues['boards'].get(timeout=self._board_timeout)
+        except queue.Empty:
+            raise TimeoutError(f'No board from the pipeline within {self._board_timeout} sec')
+        finally:
+            self._wait_time += time.perf_counter() - wait_start
+
+        if isinstance(board, Exception):
+            raise board
+        return board
+
+    def pop_stats(self):
+        now = time.perf_counter()
+        elapsed = now - self._stats_start
+        if elapsed <= 0:
+            return {}
+
+        # The search stage is the solver thread: busy whenever it is not waiting for a board.
+        stats = {'pipeline_search_occupancy': max(elapsed - self._wait_time, 0.0) / elapsed}
+        for stage in self._stages:
+            stats[f'pipeline_{stage.name}_occupancy'] = stage.pop_busy_time() / elapsed
+
+        for name, depths in self._depths.items():
+            if depths:
+                stats[f'pipeline_{name}_queue_depth'] = sum(depths) / len(depths)
+                depths.clear()
+
+        self._stats_start = now
+        self._wait_time = 0.0
+
+        return stats
+
+    def close(self):
+        for stage in self._stages:
+            stage.stop()
@@ -0,0 +1,115 @@
+import multiprocessing
+import numpy as np
+import time
+
+from strategies import batch_search
+
+
+_worker_strategy = None
+
+
+def _init_worker(strategy):
+    global _worker_strategy
+    _worker_strategy = strategy
+
+
+def _search(boards, depth):
+    return _worker_strategy.find_best_moves(boards, depth)
+
+
+class Ponderer:
+    # Searches ahead while the emulator animates a move: every spawn outcome of
+    # the board the move should produce is searched in one batch by a
+    # background process with its own copy of the strategy. When the real
+    # board is one of them, its move is taken from the batch instead of
+    # searching again.
+    def __init__(self, strategy):
+        self._pool = multiprocessing.Pool(processes=1, initializer=_init_worker, initargs=(strategy,))
+
+        self._pending = None
+        self._index = {}
+        self._depth = None
+
+        # Recent local search time per depth: how long a lookup may wait for a
+        # batch that is still running, and how much a hit saves.
+        self._search_times = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._late = 0
+        self._saved_time = 0.0
+
+    def start(self, board, depth):
+        # `board` is the packed board after the move, before its spawn.
+        children, _, _, _ = batch_search.expand_chance(np.array([board], dtype=np.uint64), np.ones(1))
+        if not len(children):
+            self.cancel()
+            return
+
+        self._index = {child: k for k, child in enumerate(children.tolist())}
+        self._depth = depth
+        self._pending = self._pool.apply_async(_search, (children, depth))
+
+    def cancel(self):
+        # The worker finishes a batch already started; its result is dropped.
+        self._pending = None
+        self._index = {}
+
+    def lookup(self, board, depth):
+        pending, index = self._pending, self._index
+        self.cancel()
+
+        if pending is None:
+            return None
+
+        k = index.get(board)
+        if k is None or depth != self._depth:
+            self._misses += 1
+            return None
+
+        # Waiting longer than a search of our own would take never pays off.
+        expected = self._search_times.get(depth)
+        wait_start = time.perf_counter()
+        pending.wait(expected or 0.0)
+        waited = time.perf_counter() - wait_start
+
+        if not pending.ready():
+            self._late += 1
+            self._misses += 1
+            return None
+
+        scores, moves = pending.get()
+        self._hits += 1
+        if expected is not None:
+            self._saved_time += max(expected - waited, 0.0)
+
+        return float(scores[k]), str(moves[k])
+
+    def record_search_time(self, depth, elapsed):
+        previous = self._search_times.get(depth)
+        self._search_times[depth] = elapsed if previous is None else previous * 0.8 + elapsed * 0.2
+
+    def pop_stats(self):
+        lookups = self._hits + self._misses
+        if lookups == 0:
+            return {}
+
+        stats = {
+            'ponder_hits': self._hits,
+            'ponder_misses': self._misses,
+            'ponder_late': self._late,
+            'ponder_hit_rate': self._hits / lookups
+        }
+        if self._hits:
+            stats['ponder_saved_time'] = self._saved_time
+
+        self._hits = 0
+        self._misses = 0
+        self._late = 0
+        self._saved_time = 0.0
+
+        return stats
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
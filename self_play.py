@@ -0,0 +1,274 @@
+import argparse
+import json
+import multiprocessing
+import numpy as np
+import os
+import time
+
+from datetime import datetime
+from game_env import GameEnvironment
+from move_selection import get_search_depth, is_aggressive_position
+from strategies import bitboard
+from strategies.factory import STRATEGIES, create_strategy
+
+
+REACH_TILES = [2048, 4096]
+
+_worker_config = None
+_worker_strategies = {}
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+    _worker_strategies.clear()
+
+
+def _get_strategy(name):
+    if name not in _worker_strategies:
+        _worker_strategies[name] = create_strategy(
+            name, weights_path=_worker_config['weights'], debug=False,
+            tt_size_mb=_worker_config['tt_size'], prob_cutoff=_worker_config['prob_cutoff'],
+            batch_search=_worker_config['batch_search'], canonical_keys=_worker_config['canonical_keys'],
+            move_cache_path=_worker_config['move_cache'], opening_book_path=_worker_config['opening_book'],
+            seed=_worker_config['seed'])
+    return _worker_strategies[name]
+
+
+def _choose_move(strategy, board, depth, time_budget):
+    # Same move selection as the Solver game loop when no depth is forced,
+    # aggressive moves included; a forced depth always searches at that depth.
+    if depth is None:
+        free_cells = np.sum(board == 0)
+        if (is_aggressive_position(free_cells, bitboard.tile_value(np.max(board)))
+                and hasattr(strategy, 'find_aggressive_move')):
+            return strategy.find_aggressive_move(board)
+
+    if time_budget is not None:
+        return strategy.find_best_move(board, time_budget=time_budget)[1]
+
+    if depth is None:
+        depth = get_search_depth(free_cells)
+
+    return strategy.find_best_move(board, depth=depth)[1]
+
+
+def play_game(strategy, seed, depth=None, time_budget=None, max_moves=None):
+    env = GameEnvironment(seed=seed)
+    strategy.new_game()
+    strategy.pop_search_stats()
+
+    latencies = []
+    nodes = 0
+    start_time = time.perf_counter()
+
+    while not env.is_game_over():
+        if max_moves is not None and env.get_move_count() >= max_moves:
+            break
+
+        board = env.get_board()
+
+        move_start = time.perf_counter()
+        direction = _choose_move(strategy, board, depth, time_budget)
+        latencies.append(time.perf_counter() - move_start)
+
+        nodes += strategy.pop_search_stats().get('search_nodes', 0)
+
+        if not env.move(direction):
+            break
+
+    return {
+        'seed': seed,
+        'max_tile': env.get_max_tile(),
+        'moves': env.get_move_count(),
+        'nodes': nodes,
+        'game_time': time.perf_counter() - start_time,
+        'latencies': latencies
+    }
+
+
+def _play_task(task):
+    name, seed = task
+    result = play_game(
+        _get_strategy(name), seed,
+        depth=_worker_config['depth'],
+        time_budget=_worker_config['time_budget'],
+        max_moves=_worker_config['max_moves'])
+    result['strategy'] = name
+    return result
+
+
+def summarize(results):
+    latencies = np.array([latency for result in results for latency in result['latencies']])
+    moves = sum(result['moves'] for result in results)
+    nodes = sum(result['nodes'] for result in results)
+    game_time = sum(result['game_time'] for result in results)
+    search_time = float(latencies.sum()) if len(latencies) else 0.0
+
+    distribution = {}
+    for result in results:
+        distribution[result['max_tile']] = distribution.get(result['max_tile'], 0) + 1
+
+    summary = {
+        'games': len(results),
+        'max_tile_distribution': {str(tile): distribution[tile] for tile in sorted(distribution)},
+        'moves_total': moves,
+        'moves_per_game': moves / len(results) if results else 0.0,
+        'moves_per_sec': moves / game_time if game_time > 0 else 0.0,
+        'nodes_total': nodes,
+        'nodes_per_sec': nodes / search_time if search_time > 0 else 0.0
+    }
+
+    for tile in REACH_TILES:
+        reached = sum(1 for result in results if result['max_tile'] >= tile)
+        summary[f'reach_{tile}_rate'] = reached / len(results) if results else 0.0
+
+    if len(latencies):
+        summary['latency_mean_ms'] = float(latencies.mean()) * 1000
+        summary['latency_p99_ms'] = float(np.percentile(latencies, 99)) * 1000
+        summary['latency_max_ms'] = float(latencies.max()) * 1000
+
+    return summary
+
+
+def run(strategies, games, seed=0, processes=None, depth=None, time_budget=None,
+        max_moves=None, tt_size=64, prob_cutoff=0.02, batch_search=False, canonical_keys=False,
+        move_cache=None, opening_book=None, weights_path=None):
+    # Game k of every strategy uses spawn seed `seed + k`, so strategies are
+    # compared on the same games and any game can be replayed on its own.
+    config = {
+        'depth': depth,
+        'time_budget': time_budget,
+        'max_moves': max_moves,
+        'tt_size': tt_size,
+        'prob_cutoff': prob_cutoff,
+        'batch_search': batch_search,
+        'canonical_keys': canonical_keys,
+        'move_cache': move_cache,
+        'opening_book': opening_book,
+        'weights': weights_path,
+        'seed': seed
+    }
+
+    available = []
+    for name in strategies:
+        try:
+            create_strategy(
+                name, weights_path=weights_path, debug=False, tt_size_mb=0, canonical_keys=canonical_keys)
+        except (FileNotFoundError, ValueError) as e:
+            print(f'Skipping {name}: {e}')
+            continue
+        available.append(name)
+    strategies = available
+
+    tasks = [(name, seed + k) for name in strategies for k in range(games)]
+
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(processes=processes, initializer=_init_worker, initargs=(config,)) as pool:
+        results = pool.map(_play_task, tasks, chunksize=1)
+    wall_time = time.perf_counter() - start_time
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'config': dict(config, games=games, seed=seed, processes=processes or os.cpu_count()),
+        'wall_time': wall_time,
+        'strategies': {}
+    }
+
+    for name in strategies:
+        strategy_results = [result for result in results if result['strategy'] == name]
+        report['strategies'][name] = {
+            'summary': summarize(strategy_results),
+            'games': [
+                {key: result[key] for key in ['seed', 'max_tile', 'moves', 'nodes', 'game_time']}
+                for result in strategy_results
+            ]
+        }
+
+    return report
+
+
+def print_report(report):
+    print(f"=== SELF-PLAY: {report['config']['games']} games per strategy, "
+          f"seed {report['config']['seed']}, {report['wall_time']:.1f}s ===")
+
+    for name, data in report['strategies'].items():
+        summary = data['summary']
+        print(f'\n{name}:')
+        print(f"  Max tiles: {summary['max_tile_distribution']}")
+        for tile in REACH_TILES:
+            print(f"  Reached {tile}: {summary[f'reach_{tile}_rate'] * 100:.1f}%")
+        print(f"  Moves/sec: {summary['moves_per_sec']:.1f}")
+        print(f"  Nodes/sec: {summary['nodes_per_sec']:.0f}")
+        if 'latency_mean_ms' in summary:
+            print(f"  Latency: mean {summary['latency_mean_ms']:.2f}ms, p99 {summary['latency_p99_ms']:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless self-play benchmark')
+    parser.add_argument(
+        '-s', '--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES),
+        help='Strategies to play (default: all)')
+    parser.add_argument(
+        '-g', '--games', type=int, default=100,
+        help='Games per strategy (default: 100)')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Spawn seed of the first game, game k uses seed + k (default: 0)')
+    parser.add_argument(
+        '-j', '--processes', type=int, default=None,
+        help='Worker processes (default: all cores)')
+    parser.add_argument(
+        '--depth', type=int, default=None,
+        help='Fixed search depth (default: same rule as the solver)')
+    parser.add_argument(
+        '--time-budget', type=float, default=None,
+        help='Search time per move in seconds, overrides --depth')
+    parser.add_argument(
+        '--max-moves', type=int, default=None,
+        help='Stop every game after this many moves (default: play to the end)')
+    parser.add_argument(
+        '--tt-size', type=float, default=64,
+        help='Transposition table memory budget in MB per process (default: 64)')
+    parser.add_argument(
+        '--prob-cutoff', type=float, default=0.02,
+        help='Spawn path probability cutoff (default: 0.02)')
+    parser.add_argument(
+        '--batch-search', action='store_true',
+        help='Search the whole tree as NumPy arrays with batched leaf evaluation')
+    parser.add_argument(
+        '--canonical-keys', action='store_true',
+        help='Key search caches on the canonical board, for symmetric evaluations (ntuple)')
+    parser.add_argument(
+        '--move-cache', default=None,
+        help='SQLite file caching search results, shared by all workers and runs (default: off)')
+    parser.add_argument(
+        '--opening-book', default=None,
+        help='Opening book from build_opening_book.py, consulted before searching (default: off)')
+    parser.add_argument(
+        '--weights', default=None,
+        help='Weights file for trained strategies (default: ntuple_weights.npy)')
+    parser.add_argument(
+        '-o', '--output', default=None,
+        help='JSON file for the results (default: self_play_<timestamp>.json)')
+
+    args = parser.parse_args()
+
+    report = run(
+        args.strategies, args.games, seed=args.seed, processes=args.processes,
+        depth=args.depth, time_budget=args.time_budget, max_moves=args.max_moves,
+        tt_size=args.tt_size, prob_cutoff=args.prob_cutoff, batch_search=args.batch_search,
+        canonical_keys=args.canonical_keys, move_cache=args.move_cache, opening_book=args.opening_book,
+        weights_path=args.weights)
+
+    print_report(report)
+
+    output = args.output or f"self_play_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f'\nResults saved to: {output}')
+
+
+if __name__ == '__main__':
+    main()
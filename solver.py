@@ -1,13 +1,21 @@
 import numpy as np
 import os
-import pyautogui
 import time
 
 from datetime import datetime
-from board_parser import BoardParser
+from move_selection import get_search_depth, is_aggressive_position
+from pipeline import Pipeline
+from ponderer import Ponderer
 from profiler import Profiler
+from strategies import batch_search, bitboard
 from strategies.simple_strategy import SimpleStrategy
 
+try:
+    import pyautogui
+except Exception:
+    # Headless runs (no display) never touch the emulator.
+    pyautogui = None
+
 
 class Solver:
     def __init__(
@@ -18,19 +26,36 @@ class Solver:
         screenshots_dir='./screenshots',
         validate_simulation=False,
         pause_on_double_2048=False,
-        enable_profiling=True
+        enable_profiling=True,
+        time_budget=None,
+        environment=None,
+        ponder=False,
+        prefetch=False,
+        pipeline=False
     ):
         self._debug = debug
-        self._board_parser = BoardParser(debug=debug, calibration_dir='./')
+        self._environment = environment
+        self._board_parser = None
+        if environment is None:
+            # Imported here so headless runs need neither OpenCV nor screen capture.
+            from board_parser import BoardParser
+            self._board_parser = BoardParser(debug=debug, calibration_dir='./')
 
         self._strategy = strategy or SimpleStrategy(debug=self._debug)
 
         self._validate_simulation = validate_simulation
         self._pause_on_double_2048 = pause_on_double_2048
         self._enable_profiling = enable_profiling
+        self._time_budget = time_budget
 
         self._profiler = Profiler(enabled=enable_profiling)
 
+        # Pondered batches are searched at the fixed depths of the game loop.
+        self._ponderer = Ponderer(self._strategy) if ponder and time_budget is None else None
+        self._prefetch = prefetch and time_budget is None
+        self._next_moves = {}
+        self._pipeline = pipeline
+
         self._move_count = 0
         self._consecutive_failures = 0
         self._max_tile_reached = 0
@@ -44,7 +69,7 @@ class Solver:
         self.setup_logging()
 
     def has_double_2048(self, board):
-        return np.sum(board == 2048) >= 2
+        return np.sum(board == bitboard.tile_exponent(2048)) >= 2
 
     def wait_for_manual_completion(self, board):
         print('\n' + '='*60)
@@ -111,8 +136,8 @@ class Solver:
                 print('\nDIFFERENCES:')
                 for i in range(4):
                     for j in range(4):
-                        actual = board_after_actual[i, j]
-                        simulated = board_after_simulated[i, j]
+                        actual = bitboard.tile_value(board_after_actual[i, j])
+                        simulated = bitboard.tile_value(board_after_simulated[i, j])
                         if actual != simulated:
                             print(f'  Position ({i},{j}): Actual={actual}, Simulated={simulated}')
 
@@ -153,8 +178,8 @@ class Solver:
                 f.write('\nDIFFERENCES:\n')
                 for i in range(4):
                     for j in range(4):
-                        actual = board_after_actual[i, j]
-                        simulated = board_after_simulated[i, j]
+                        actual = bitboard.tile_value(board_after_actual[i, j])
+                        simulated = bitboard.tile_value(board_after_simulated[i, j])
                         if actual != simulated:
                             f.write(f'  Position ({i},{j}): Actual={actual}, Simulated={simulated}\n')
 
@@ -164,6 +189,7 @@ class Solver:
             print(f'Failed to save validation report: {e}')
 
     def _write_board_to_file(self, file, board):
+        board = bitboard.decode_board(board)
         for i in range(4):
             row = [f'{cell:4}' if cell != 0 else '   .' for cell in board[i]]
             file.write(' '.join(row) + '\n')
@@ -203,6 +229,9 @@ class Solver:
             self._log_file.close()
 
     def save_final_screenshot(self):
+        if self._environment:
+            return False
+
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             screenshot_path = os.path.join(self._screenshots_dir, f'game_over_{timestamp}.png')
@@ -221,6 +250,10 @@ class Solver:
     def restart_game(self):
         self.log('Restarting game...')
 
+        if self._environment:
+            self._environment.reset()
+            return True
+
         try:
             pyautogui.keyDown('enter')
             time.sleep(0.1)
@@ -265,13 +298,137 @@ class Solver:
             return self._strategy.get_game_phase(max_tile)
         return 'mid'
 
+    def record_search_stats(self):
+        stats = self._strategy.pop_search_stats()
+        if self._ponderer is not None:
+            stats.update(self._ponderer.pop_stats())
+
+        for key, value in stats.items():
+            self._profiler.record_value(key, value)
+
+    def choose_move(self, board, free_cells):
+        depth = get_search_depth(free_cells)
+        packed = bitboard.to_bitboard(board)
+
+        next_moves, self._next_moves = self._next_moves, {}
+        if packed in next_moves:
+            self._profiler.record_value('prefetch_reused', 1)
+            return next_moves[packed]
+
+        if self._ponderer is not None:
+            pondered = self._ponderer.lookup(packed, depth)
+            if pondered is not None:
+                return pondered[1]
+
+        search_start = time.perf_counter()
+        _, best_direction = self._strategy.find_best_move(board, depth=depth)
+
+        if self._ponderer is not None:
+            self._ponderer.record_search_time(depth, time.perf_counter() - search_start)
+
+        return best_direction
+
+    def start_pondering(self, board, direction):
+        # Runs while the key press is sent and the emulator animates the move.
+        after = bitboard.move(bitboard.to_bitboard(board), direction)
+        self._ponderer.start(after, get_search_depth(bitboard.count_empty(after) - 1))
+
+    def find_follow_up_move(self, board, direction, target_score):
+        # Searches every spawn outcome of the move in one batch. The moves are
+        # kept for the next decision, and when all outcomes share the same move
+        # it is returned so it can be sent before the board is read again.
+        after = bitboard.move(bitboard.to_bitboard(board), direction)
+        free_cells = bitboard.count_empty(after) - 1
+        children, _, _, _ = batch_search.expand_chance(np.array([after], dtype=np.uint64), np.ones(1))
+
+        scores, moves = self._strategy.find_best_moves(children, get_search_depth(free_cells))
+        self._next_moves = dict(zip(children.tolist(), moves.tolist()))
+
+        # Positions the game loop would not answer with a plain search are never played blind.
+        max_tile = bitboard.tile_value(bitboard.get_max_exponent(after))
+        if (max_tile >= target_score or self._pause_on_double_2048
+                or is_aggressive_position(free_cells, max_tile)):
+            return None
+
+        invariant = bool(np.isfinite(scores).all() and (moves == moves[0]).all())
+        self._profiler.record_value('prefetch_rate', int(invariant))
+
+        return str(moves[0]) if invariant else None
+
+    def is_successor(self, board, moves, new_board):
+        # Whether new_board can follow board after the moves: the result of the
+        # last move with one new tile on a cell that was empty. Moves before it
+        # spawned a tile of their own on any of their empty cells.
+        if not moves:
+            return np.array_equal(board, new_board)
+
+        candidates = np.array([bitboard.to_bitboard(board)], dtype=np.uint64)
+        for k, direction in enumerate(moves):
+            if k > 0:
+                candidates, _, _, _ = batch_search.expand_chance(candidates, np.ones(len(candidates)))
+            candidates = bitboard.move_many(candidates, direction)
+
+        expected = bitboard.exponents_many(candidates)
+        actual = np.asarray(new_board).reshape(16)
+
+        changed = expected != actual
+        spawned = (changed.sum(axis=1) == 1) & ~(changed & ((expected != 0) | (actual > 2))).any(axis=1)
+        return bool(spawned.any())
+
+    def confirm_follow_up(self, board, direction, follow_up, new_board):
+        if self.is_successor(board, [direction, follow_up], new_board):
+            return
+
+        self._profiler.record_value('prefetch_mismatches', 1)
+        self.log(f'Board after {direction} + prefetched {follow_up} does not match any spawn', level='ERROR')
+        if self._debug:
+            print(self.print_compact_board(new_board))
+
+        if self._validate_simulation:
+            raise SimulationValidationError(f'Prefetched move {follow_up} not confirmed')
+
+    def create_pipeline(self):
+        if self._environment:
+            return Pipeline(self._environment.get_board, lambda board: board, self.make_move)
+
+        return Pipeline(self._board_parser.capture_board, self._board_parser.classify_board, self.make_move)
+
+    def read_pipelined_board(self, pipeline, board, moves):
+        # Frames taken before the game has finished the moves match no spawn
+        # after them; they are dropped and the board is captured again. A board
+        # that never settles is taken as it is after a second.
+        deadline = time.perf_counter() + 1.0
+
+        while True:
+            new_board = pipeline.next_board()
+            if board is None or self.is_successor(board, moves, new_board):
+                return new_board
+
+            self._profiler.record_value('pipeline_dropped_frames', 1)
+
+            if time.perf_counter() > deadline:
+                self.log(f'Board after {moves} does not match any spawn, continuing from it', level='ERROR')
+                if self._validate_simulation:
+                    raise SimulationValidationError(f'Board after {moves} not confirmed')
+                return new_board
+
+            pipeline.request_board()
+
     def get_board_state(self):
+        if self._environment:
+            return self._environment.get_board()
+
         board, _ = self._board_parser.parse_board()
         return board
 
     def make_move(self, direction):
         self.log(f'Executing: {direction}', level='INFO')
 
+        if self._environment:
+            self._environment.move(direction)
+            self._move_count += 1
+            return
+
         for _ in range(1):
             pyautogui.keyDown(direction)
             time.sleep(0.005)
@@ -283,15 +440,20 @@ class Solver:
         time.sleep(0.01)
 
     def has_reached_target(self, board, target=384):
-        reached = np.any(board >= target)
+        # Smallest tile exponent whose value is at least the target.
+        reached = np.any(board >= (target - 1).bit_length())
         if reached:
             self.log(f'🎉 TARGET {target} REACHED! 🎉')
         return reached
 
     def is_game_over(self, board):
+        if self._environment:
+            return self._environment.is_game_over()
+
         return self._strategy.is_game_over(board)
 
     def print_compact_board(self, board):
+        board = bitboard.decode_board(board)
         board_str = ''
         for i in range(4):
             row = [f'{cell:2}' if cell > 0 else ' .' for cell in board[i]]
@@ -302,21 +464,40 @@ class Solver:
         if self._enable_profiling:
             self._profiler.start_game()
 
+        self._strategy.new_game()
+        if self._ponderer is not None:
+            self._ponderer.cancel()
+
         self.log(f'Starting new game - target: {target_score}')
         if self._pause_on_double_2048:
             self.log('Pause mode for two 2048 tiles: ENABLED')
-        self._board_parser.countdown_timer(3)
+        if not self._environment:
+            self._board_parser.countdown_timer(3)
 
         max_failures = 5
         aggressive_mode = False
 
+        # In pipelined mode the board read after the moves of one iteration
+        # is checked against them and becomes the board of the next.
+        pipeline = self.create_pipeline() if self._pipeline else None
+        board = None
+        previous_board = None
+        sent_moves = []
+        if pipeline is not None:
+            pipeline.request_board()
+
         try:
             while True:
                 try:
                     if self._enable_profiling:
                         self._profiler.start_timer('board_parsing')
 
-                    board = self.get_board_state()
+                    if pipeline is None:
+                        board = self.get_board_state()
+                    else:
+                        board = self.read_pipelined_board(pipeline, previous_board, sent_moves)
+                        previous_board = board
+                        sent_moves = []
 
                     if self._enable_profiling:
                         self._profiler.stop_timer('board_parsing')
@@ -327,7 +508,12 @@ class Solver:
                         self._pause_on_double_2048 = False
                         self.log('Resuming automatic game...')
 
-                    current_max = np.max(board)
+                        if pipeline is not None:
+                            previous_board = None
+                            pipeline.request_board()
+                            continue
+
+                    current_max = bitboard.tile_value(np.max(board))
                     free_cells = np.sum(board == 0)
 
                     phase = self.get_game_phase(current_max)
@@ -347,31 +533,59 @@ class Solver:
                         self.log('GAME OVER - NO MOVES LEFT')
                         break
 
-                    if free_cells <= 3 and current_max >= 48:
+                    if is_aggressive_position(free_cells, current_max):
                         aggressive_mode = True
                         self.log('ACTIVATING AGGRESSIVE MODE - few free cells and high tiles')
 
                     if self._enable_profiling:
                         self._profiler.start_timer('move_selection')
 
+                    follow_up = None
+                    searched_ahead = False
+
                     if aggressive_mode and hasattr(self._strategy, 'find_aggressive_move'):
                         aggressive_dir = self._strategy.find_aggressive_move(board)
                         direction = aggressive_dir
                         aggressive_mode = False
-                    else:
-                        depth = 3 if free_cells <= 4 else 2
-                        _, best_direction = self._strategy.find_best_move(board, depth=depth)
+                    elif self._time_budget is not None:
+                        _, best_direction = self._strategy.find_best_move(board, time_budget=self._time_budget)
                         direction = best_direction
+                    else:
+                        direction = self.choose_move(board, free_cells)
+                        if self._prefetch:
+                            follow_up = self.find_follow_up_move(board, direction, target_score)
+                            searched_ahead = True
 
                     if self._enable_profiling:
                         self._profiler.stop_timer('move_selection')
                         self._profiler.record_value('moves_per_game', 1)
+                        self.record_search_stats()
+                        if pipeline is not None:
+                            for key, value in pipeline.pop_stats().items():
+                                self._profiler.record_value(key, value)
+
+                    if self._ponderer is not None and not searched_ahead:
+                        self.start_pondering(board, direction)
+
+                    if follow_up is not None:
+                        self.log(f'Prefetched follow-up: {follow_up}', level='INFO')
+                        self._profiler.record_value('prefetched_moves', 1)
+
+                    if pipeline is not None:
+                        sent_moves = [direction] + ([follow_up] if follow_up is not None else [])
+                        pipeline.send_moves(sent_moves)
+                        self._consecutive_failures = 0
+                        continue
 
                     if self._enable_profiling:
                         self._profiler.start_timer('move_execution')
 
                     self.make_move(direction)
 
+                    # Sent at once, without reading the board in between.
+                    if follow_up is not None:
+                        self.make_move(follow_up)
+
                     if self._enable_profiling:
                         self._profiler.stop_timer('move_execution')
 
@@ -379,7 +593,9 @@ class Solver:
                         self._profiler.start_timer('board_validation')
 
                     new_board = self.get_board_state()
-                    if self._validate_simulation:
+                    if follow_up is not None:
+                        self.confirm_follow_up(board, direction, follow_up, new_board)
+                    elif self._validate_simulation:
                         self.validate_simulation(board, direction, new_board)
 
                     if self._enable_profiling:
@@ -399,8 +615,18 @@ class Solver:
                         break
                     time.sleep(1)
 
+                    # After an error it is unknown which moves reached the game,
+                    # so the next board is taken as it is.
+                    if pipeline is not None:
+                        previous_board = None
+                        sent_moves = []
+                        pipeline.request_board()
+
         finally:
-            final_score = np.max(board)
+            if pipeline is not None:
+                pipeline.close()
+
+            final_score = bitboard.tile_value(np.max(board)) if board is not None else 0
             final_stats = f'Game finished - Moves: {self._move_count}, Max tile: {final_score}'
 
             self.log(final_stats)
@@ -412,7 +638,7 @@ class Solver:
                 self._profiler.record_value('moves_count', self._move_count)
                 self._profiler.print_report(log_func=self.log)
 
-            return np.max(board), self._move_count
+            return final_score, self._move_count
 
     def play(self, target_score=384, max_games=None):
         game_count = 0
@@ -439,7 +665,8 @@ class Solver:
                 self.restart_game()
                 self.reset_game_stats()
 
-                time.sleep(1)
+                if not self._environment:
+                    time.sleep(1)
 
         except KeyboardInterrupt:
             self.log('Game interrupted by user')
@@ -456,6 +683,9 @@ class Solver:
                 self.log(f'Best score: {best_score}')
                 self.log(f'Average moves per game: {avg_moves:.1f}')
 
+            self._strategy.close()
+            if self._ponderer is not None:
+                self._ponderer.close()
             self.close_logging()
 
 
@@ -1,6 +1,7 @@
 import numpy as np
 
 from abc import ABC, abstractmethod
+from strategies import bitboard
 
 
 class BaseStrategy(ABC):
@@ -15,125 +16,36 @@ class BaseStrategy(ABC):
     def evaluate_position(self, board):
         pass
 
-    def can_merge(self, a, b):
-        return a != 0 and a == b
-
-    def simulate_move(self, board, direction):
-        new_board = board.copy()
-        changed = False
-
-        if direction == 'left':
-            for i in range(4):
-                line = new_board[i].copy()
-                new_line, line_changed = self._process_line_left(line)
-                new_board[i] = new_line
-                if line_changed:
-                    changed = True
-
-        elif direction == 'right':
-            for i in range(4):
-                line = new_board[i].copy()
-                new_line, line_changed = self._process_line_right(line)
-                new_board[i] = new_line
-                if line_changed:
-                    changed = True
-
-        elif direction == 'up':
-            for j in range(4):
-                col = new_board[:, j].copy()
-                new_col, col_changed = self._process_line_left(col)
-                new_board[:, j] = new_col
-                if col_changed:
-                    changed = True
-
-        elif direction == 'down':
-            for j in range(4):
-                col = new_board[:, j].copy()
-                new_col, col_changed = self._process_line_right(col)
-                new_board[:, j] = new_col
-                if col_changed:
-                    changed = True
-
-        return new_board, changed
+    def find_best_moves(self, boards, depth=3):
+        # One search per board; strategies with a batched search override this.
+        results = [
+            self.find_best_move(int(board) if bitboard.is_packed(board) else board, depth=depth)
+            for board in boards
+        ]
+        return np.array([score for score, _ in results]), np.array([move for _, move in results])
 
-    def _process_line_left(self, line):
-        original = line.copy()
-        new_line = line.copy()
-        moved = [False] * 4
-
-        i = 0
-        while i < 4:
-            if new_line[i] == 0:
-                for j in range(i + 1, 4):
-                    if new_line[j] != 0:
-                        new_line[i] = new_line[j]
-                        new_line[j] = 0
-                        moved[i] = True
+    def new_game(self):
+        pass
 
-                        if i > 0 and new_line[i] == new_line[i - 1] and not moved[i - 1]:
-                            new_line[i - 1] *= 2
-                            new_line[i] = 0
-                            moved[i - 1] = True
-                        else:
-                            i += 1
-                        break
-                else:
-                    i += 1
-            else:
-                if i > 0 and new_line[i] == new_line[i - 1] and not moved[i - 1]:
-                    new_line[i - 1] *= 2
-                    new_line[i] = 0
-                    moved[i - 1] = True
-                else:
-                    i += 1
+    def pop_search_stats(self):
+        return {}
 
-        changed = not np.array_equal(original, new_line)
-        return new_line, changed
+    def close(self):
+        pass
 
-    def _process_line_right(self, line):
-        original = line.copy()
-        new_line = line.copy()
-        moved = [False] * 4
+    def can_merge(self, a, b):
+        return a != 0 and a == b
 
-        i = 3
-        while i >= 0:
-            if new_line[i] == 0:
-                for j in range(i - 1, -1, -1):
-                    if new_line[j] != 0:
-                        new_line[i] = new_line[j]
-                        new_line[j] = 0
-                        moved[i] = True
+    def simulate_move(self, board, direction):
+        if bitboard.is_packed(board):
+            board = int(board)
+            new_board = bitboard.move(board, direction)
+            return new_board, new_board != board
 
-                        if i < 3 and new_line[i] == new_line[i + 1] and not moved[i + 1]:
-                            new_line[i + 1] *= 2
-                            new_line[i] = 0
-                            moved[i + 1] = True
-                        else:
-                            i -= 1
-                        break
-                else:
-                    i -= 1
-            else:
-                if i < 3 and new_line[i] == new_line[i + 1] and not moved[i + 1]:
-                    new_line[i + 1] *= 2
-                    new_line[i] = 0
-                    moved[i + 1] = True
-                else:
-                    i -= 1
+        packed = bitboard.to_bitboard(board)
+        new_packed = bitboard.move(packed, direction)
 
-        changed = not np.array_equal(original, new_line)
-        return new_line, changed
+        return bitboard.from_bitboard(new_packed), new_packed != packed
 
     def is_game_over(self, board):
-        if np.any(board == 0):
-            return False
-
-        for i in range(4):
-            for j in range(3):
-                if board[i, j] == board[i, j + 1]:
-                    return False
-
-                if board[j, i] == board[j + 1, i]:
-                    return False
-
-        return True
+        return bitboard.is_game_over(bitboard.as_bitboard(board))
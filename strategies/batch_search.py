@@ -0,0 +1,123 @@
+import numpy as np
+
+from strategies import bitboard
+
+
+MOVES = ['left', 'right', 'up', 'down']
+
+# Spawn cells in the order SimpleStrategy._get_empty_cells visits them, so a
+# chance node adds up its children in the same order as _search_node and gets
+# a bit-identical expected value.
+SPAWN_CELLS = np.array(sorted(range(16), key=lambda k: min(k // 4, 3 - k // 4) + min(k % 4, 3 - k % 4)))
+
+# Chance node child slot 2 * k + t: a tile of exponent t + 1 on SPAWN_CELLS[k].
+_SPAWN_TILES = np.tile(np.array([1, 2], dtype=np.uint64), 16)
+_SPAWN_SHIFTS = np.repeat(SPAWN_CELLS.astype(np.uint64) * np.uint64(4), 2)
+_SPAWN_PROBS = np.tile([0.9, 0.1], 16)
+
+# Lowest probability a spawn can give a child: a 4 on one of 16 empty cells.
+_MIN_SPAWN_PROB = 0.1 / 16
+
+# Boards scored per evaluation call, to bound the memory of the vectorized evaluators.
+EVAL_CHUNK = 1 << 16
+
+
+def expand_max(boards):
+    # Children of max nodes, in slot 4 * node + move for every legal move.
+    moved = np.stack([bitboard.move_many(boards, move) for move in MOVES], axis=1)
+    legal = moved != boards[:, np.newaxis]
+    slots = np.flatnonzero(legal)
+
+    return moved.ravel()[slots], slots, ~legal.any(axis=1)
+
+
+def expand_chance(boards, probs):
+    # Children of chance nodes, in slot 32 * node + spawn for every empty cell,
+    # with the same path probabilities as _search_node.
+    empty = bitboard.exponents_many(boards)[:, SPAWN_CELLS] == 0
+    counts = empty.sum(axis=1)
+    slots = np.flatnonzero(np.repeat(empty, 2, axis=1))
+
+    nodes = slots // 32
+    spawns = slots % 32
+    children = boards[nodes] | (_SPAWN_TILES[spawns] << _SPAWN_SHIFTS[spawns])
+    child_probs = probs[nodes] / counts[nodes] * _SPAWN_PROBS[spawns]
+
+    return children, child_probs, slots, counts
+
+
+def reduce_max(count, slots, child_values):
+    values = np.full(count * 4, -np.inf)
+    values[slots] = child_values
+    values = values.reshape(count, 4)
+
+    # argmax keeps the first of equal moves, like the strict > in _search_root.
+    return values.max(axis=1), values.argmax(axis=1)
+
+
+def reduce_chance(count, slots, child_values, counts):
+    weighted = np.zeros(count * 32)
+    weighted[slots] = child_values * _SPAWN_PROBS[slots % 32]
+
+    # A running sum adds the children one by one in slot order, as _search_node does.
+    return np.cumsum(weighted.reshape(count, 32), axis=1)[:, -1] / np.maximum(counts, 1)
+
+
+def cutoff_free(depth, is_maximizing, min_prob, prob_cutoff):
+    # True when no probability cutoff can happen anywhere below nodes of this
+    # level, so their values depend on the board alone and duplicates can share one.
+    if prob_cutoff <= 0:
+        return True
+
+    # Cutoffs happen among the children of chance nodes with 2 or more plies left.
+    first = depth if not is_maximizing else depth - 1
+    layers = len(range(first, 1, -2))
+    if layers == 0:
+        return True
+
+    return min_prob * _MIN_SPAWN_PROB ** layers >= prob_cutoff * (1 + 1e-9)
+
+
+class EvaluationCache:
+    # Static evaluations of packed boards, kept as sorted arrays so a whole
+    # batch is looked up and extended with a few vectorized calls.
+    def __init__(self, evaluate):
+        self._evaluate = evaluate
+        self._boards = np.empty(0, dtype=np.uint64)
+        self._values = np.empty(0)
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._boards)
+
+    def evaluate(self, boards):
+        unique, inverse = np.unique(boards, return_inverse=True)
+
+        positions = np.searchsorted(self._boards, unique)
+        found = positions < len(self._boards)
+        found[found] = self._boards[positions[found]] == unique[found]
+
+        values = np.empty(len(unique))
+        values[found] = self._values[positions[found]]
+
+        missing = unique[~found]
+        if len(missing):
+            new_values = np.concatenate([
+                np.asarray(self._evaluate(missing[start:start + EVAL_CHUNK]), dtype=np.float64)
+                for start in range(0, len(missing), EVAL_CHUNK)
+            ])
+            values[~found] = new_values
+
+            merged = np.concatenate([self._boards, missing])
+            order = np.argsort(merged, kind='stable')
+            self._boards = merged[order]
+            self._values = np.concatenate([self._values, new_values])[order]
+
+        # Every lookup that needed no new evaluation counts as a hit, including
+        # repeats of the same board within the batch.
+        self.hits += len(boards) - len(missing)
+        self.misses += len(missing)
+
+        return values[inverse]
@@ -0,0 +1,326 @@
+import numbers
+import numpy as np
+
+
+# Boards are stored as tile exponents (0 for an empty cell, 1 for 2, 2 for 4,
+# ...): a (4, 4) uint8 array outside the search, and inside it one 64-bit
+# integer where cell (i, j) is the nibble at bit offset 4 * (4 * i + j), so
+# row i occupies bits 16 * i .. 16 * i + 15. Tile values are only decoded
+# for display and logging.
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+MAX_EXPONENT = 15
+
+_SHIFTS = tuple(range(0, 64, 4))
+
+
+def _unpack_row(row):
+    return [(row >> (4 * j)) & 0xF for j in range(4)]
+
+
+def _pack_row(cells):
+    return cells[0] | (cells[1] << 4) | (cells[2] << 8) | (cells[3] << 12)
+
+
+def _reverse_row(row):
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+def _unpack_col(row):
+    return (row | (row << 12) | (row << 24) | (row << 36)) & COL_MASK
+
+
+def _move_line_left(cells):
+    # Same sliding and merging rules as the game on the emulator: a cell that
+    # has already received a tile during this move cannot take part in a merge.
+    # Also returns the score of the move: the sum of the merged tile values.
+    line = list(cells)
+    moved = [False] * 4
+    score = 0
+
+    i = 0
+    while i < 4:
+        if line[i] == 0:
+            for j in range(i + 1, 4):
+                if line[j] != 0:
+                    line[i] = line[j]
+                    line[j] = 0
+                    moved[i] = True
+
+                    if i > 0 and line[i] == line[i - 1] and not moved[i - 1]:
+                        line[i - 1] = min(line[i - 1] + 1, MAX_EXPONENT)
+                        line[i] = 0
+                        moved[i - 1] = True
+                        score += 1 << line[i - 1]
+                    else:
+                        i += 1
+                    break
+            else:
+                i += 1
+        else:
+            if i > 0 and line[i] == line[i - 1] and not moved[i - 1]:
+                line[i - 1] = min(line[i - 1] + 1, MAX_EXPONENT)
+                line[i] = 0
+                moved[i - 1] = True
+                score += 1 << line[i - 1]
+            else:
+                i += 1
+
+    return line, score
+
+
+def _build_tables():
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    col_up = [0] * 65536
+    col_down = [0] * 65536
+    score_left = [0] * 65536
+    score_right = [0] * 65536
+
+    for row in range(65536):
+        left_cells, left_score = _move_line_left(_unpack_row(row))
+        right_cells, right_score = _move_line_left(_unpack_row(_reverse_row(row)))
+        left = _pack_row(left_cells)
+        right = _reverse_row(_pack_row(right_cells))
+
+        row_left[row] = left
+        row_right[row] = right
+        col_up[row] = _unpack_col(left)
+        col_down[row] = _unpack_col(right)
+        score_left[row] = left_score
+        score_right[row] = right_score
+
+    return row_left, row_right, col_up, col_down, score_left, score_right
+
+
+_ROW_LEFT, _ROW_RIGHT, _COL_UP, _COL_DOWN, _SCORE_LEFT, _SCORE_RIGHT = _build_tables()
+
+
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def flip_rows(board):
+    # Mirror left-right: reverse the nibbles of every row.
+    board = ((board & 0xF0F0F0F0F0F0F0F0) >> 4) | ((board & 0x0F0F0F0F0F0F0F0F) << 4)
+    return ((board & 0xFF00FF00FF00FF00) >> 8) | ((board & 0x00FF00FF00FF00FF) << 8)
+
+
+def flip_columns(board):
+    # Mirror top-bottom: reverse the order of the rows.
+    board = ((board & 0xFFFF0000FFFF0000) >> 16) | ((board & 0x0000FFFF0000FFFF) << 16)
+    return ((board & 0xFFFFFFFF00000000) >> 32) | ((board & 0x00000000FFFFFFFF) << 32)
+
+
+def symmetries(board):
+    # The 8 images of the board under rotations and reflections; works on one
+    # packed board or on a uint64 array of them.
+    images = []
+    for image in (board, transpose(board)):
+        mirrored = flip_rows(image)
+        images += [image, mirrored, flip_columns(image), flip_columns(mirrored)]
+    return images
+
+
+def canonical(board):
+    # Smallest packed image: equal for all boards that are symmetric to each other.
+    return min(symmetries(board))
+
+
+def canonical_many(boards):
+    return np.minimum.reduce(symmetries(boards))
+
+
+def move_left(board):
+    return (
+        _ROW_LEFT[board & ROW_MASK]
+        | (_ROW_LEFT[(board >> 16) & ROW_MASK] << 16)
+        | (_ROW_LEFT[(board >> 32) & ROW_MASK] << 32)
+        | (_ROW_LEFT[(board >> 48) & ROW_MASK] << 48)
+    )
+
+
+def move_right(board):
+    return (
+        _ROW_RIGHT[board & ROW_MASK]
+        | (_ROW_RIGHT[(board >> 16) & ROW_MASK] << 16)
+        | (_ROW_RIGHT[(board >> 32) & ROW_MASK] << 32)
+        | (_ROW_RIGHT[(board >> 48) & ROW_MASK] << 48)
+    )
+
+
+def move_up(board):
+    t = transpose(board)
+    return (
+        _COL_UP[t & ROW_MASK]
+        | (_COL_UP[(t >> 16) & ROW_MASK] << 4)
+        | (_COL_UP[(t >> 32) & ROW_MASK] << 8)
+        | (_COL_UP[(t >> 48) & ROW_MASK] << 12)
+    )
+
+
+def move_down(board):
+    t = transpose(board)
+    return (
+        _COL_DOWN[t & ROW_MASK]
+        | (_COL_DOWN[(t >> 16) & ROW_MASK] << 4)
+        | (_COL_DOWN[(t >> 32) & ROW_MASK] << 8)
+        | (_COL_DOWN[(t >> 48) & ROW_MASK] << 12)
+    )
+
+
+MOVE_FUNCTIONS = {
+    'left': move_left,
+    'right': move_right,
+    'up': move_up,
+    'down': move_down
+}
+
+
+def move(board, direction):
+    return MOVE_FUNCTIONS[direction](board)
+
+
+def _rows_score(table, board):
+    return (
+        table[board & ROW_MASK]
+        + table[(board >> 16) & ROW_MASK]
+        + table[(board >> 32) & ROW_MASK]
+        + table[(board >> 48) & ROW_MASK]
+    )
+
+
+def move_score(board, direction):
+    # Columns are the rows of the transposed board, read top to bottom.
+    if direction == 'left':
+        return _rows_score(_SCORE_LEFT, board)
+    if direction == 'right':
+        return _rows_score(_SCORE_RIGHT, board)
+    if direction == 'up':
+        return _rows_score(_SCORE_LEFT, transpose(board))
+    return _rows_score(_SCORE_RIGHT, transpose(board))
+
+
+# NumPy copies of the tables for moving whole arrays of packed boards (uint64)
+# at once; every board in the array follows exactly the same rules as move().
+_ROW_LEFT_ARRAY = np.array(_ROW_LEFT, dtype=np.uint64)
+_ROW_RIGHT_ARRAY = np.array(_ROW_RIGHT, dtype=np.uint64)
+_COL_UP_ARRAY = np.array(_COL_UP, dtype=np.uint64)
+_COL_DOWN_ARRAY = np.array(_COL_DOWN, dtype=np.uint64)
+_SCORE_LEFT_ARRAY = np.array(_SCORE_LEFT, dtype=np.int64)
+_SCORE_RIGHT_ARRAY = np.array(_SCORE_RIGHT, dtype=np.int64)
+_SHIFTS_ARRAY = np.array(_SHIFTS, dtype=np.uint64)
+
+
+def _lines_many(table, boards, spacing):
+    return (
+        table[boards & ROW_MASK]
+        | (table[(boards >> 16) & ROW_MASK] << spacing)
+        | (table[(boards >> 32) & ROW_MASK] << (2 * spacing))
+        | (table[(boards >> 48) & ROW_MASK] << (3 * spacing))
+    )
+
+
+def move_many(boards, direction):
+    if direction == 'left':
+        return _lines_many(_ROW_LEFT_ARRAY, boards, 16)
+    if direction == 'right':
+        return _lines_many(_ROW_RIGHT_ARRAY, boards, 16)
+    if direction == 'up':
+        return _lines_many(_COL_UP_ARRAY, transpose(boards), 4)
+    return _lines_many(_COL_DOWN_ARRAY, transpose(boards), 4)
+
+
+def move_score_many(boards, direction):
+    if direction in ('up', 'down'):
+        boards = transpose(boards)
+    table = _SCORE_LEFT_ARRAY if direction in ('left', 'up') else _SCORE_RIGHT_ARRAY
+
+    return (
+        table[boards & ROW_MASK]
+        + table[(boards >> 16) & ROW_MASK]
+        + table[(boards >> 32) & ROW_MASK]
+        + table[(boards >> 48) & ROW_MASK]
+    )
+
+
+def exponents_many(boards):
+    return (boards[:, np.newaxis] >> _SHIFTS_ARRAY) & 0xF
+
+
+def to_bitboard_many(boards):
+    exponents = np.asarray(boards).reshape(-1, 16).astype(np.uint64)
+    return np.bitwise_or.reduce(exponents << _SHIFTS_ARRAY, axis=1)
+
+
+def is_game_over(board):
+    for move_function in MOVE_FUNCTIONS.values():
+        if move_function(board) != board:
+            return False
+    return True
+
+
+def get_empty_cells(board):
+    return [(k >> 2, k & 3) for k in range(16) if not (board >> (4 * k)) & 0xF]
+
+
+def count_empty(board):
+    return sum(1 for shift in _SHIFTS if not (board >> shift) & 0xF)
+
+
+def place_tile(board, i, j, exponent):
+    return board | (exponent << (4 * (4 * i + j)))
+
+
+def get_max_exponent(board):
+    return max((board >> shift) & 0xF for shift in _SHIFTS)
+
+
+def tile_sum(board):
+    return sum(1 << exponent for exponent in ((board >> shift) & 0xF for shift in _SHIFTS) if exponent)
+
+
+def tile_exponent(value):
+    value = int(value)
+    return value.bit_length() - 1 if value > 0 else 0
+
+
+def tile_value(exponent):
+    exponent = int(exponent)
+    return 1 << exponent if exponent > 0 else 0
+
+
+def decode_board(board):
+    exponents = np.asarray(board, dtype=np.int64)
+    return np.where(exponents > 0, 1 << exponents, 0)
+
+
+def is_packed(board):
+    # Python ints and NumPy integer scalars, such as items of a uint64 array.
+    return isinstance(board, numbers.Integral)
+
+
+def as_bitboard(board):
+    return int(board) if is_packed(board) else to_bitboard(board)
+
+
+def to_bitboard(board):
+    if np.shape(board) != (4, 4):
+        raise ValueError(f'Expected a 4x4 board of exponents, got shape {np.shape(board)}')
+
+    packed = 0
+    for shift, exponent in zip(_SHIFTS, board.flat):
+        packed |= int(exponent) << shift
+    return packed
+
+
+def from_bitboard(packed):
+    return np.array([(packed >> shift) & 0xF for shift in _SHIFTS], dtype=np.uint8).reshape(4, 4)
@@ -0,0 +1,40 @@
+from strategies.improved_strategy import ImprovedStrategy
+from strategies.monte_carlo_strategy import MonteCarloStrategy
+from strategies.ntuple_strategy import NTupleStrategy
+from strategies.simple_strategy import SimpleStrategy
+from strategies.star_strategy import StarStrategy
+
+
+STRATEGIES = {
+    'simple': SimpleStrategy,
+    'improved': ImprovedStrategy,
+    'star': StarStrategy,
+    'ntuple': NTupleStrategy,
+    'montecarlo': MonteCarloStrategy
+}
+
+_SEARCH_OPTIONS = {
+    'tt_size_mb', 'prob_cutoff', 'workers', 'move_cache_path', 'move_cache_entries', 'opening_book_path'
+}
+_BATCH_OPTIONS = {'batch_search', 'canonical_keys'}
+
+# Options each strategy takes besides `debug`. Callers pass every option they
+# have; the ones a strategy does not take, or that are None, are left out.
+STRATEGY_OPTIONS = {
+    'simple': _SEARCH_OPTIONS | _BATCH_OPTIONS,
+    'improved': _SEARCH_OPTIONS | _BATCH_OPTIONS,
+    'star': _SEARCH_OPTIONS,
+    'ntuple': _SEARCH_OPTIONS | _BATCH_OPTIONS | {'weights_path'},
+    'montecarlo': {'playouts', 'playout_policy', 'max_playout_moves', 'workers', 'seed'}
+}
+
+
+def create_strategy(name, debug=True, **options):
+    if name not in STRATEGIES:
+        raise ValueError(f'Unknown strategy: {name}')
+
+    kwargs = {
+        key: value for key, value in options.items()
+        if key in STRATEGY_OPTIONS[name] and value is not None
+    }
+    return STRATEGIES[name](debug=debug, **kwargs)
@@ -1,12 +1,80 @@
 import math
 import numpy as np
 
+from strategies import bitboard, row_heuristics
 from strategies.simple_strategy import SimpleStrategy
 
 
+# Every pair of neighbouring cells on the flattened board: 12 horizontal pairs
+# (left, right) followed by 12 vertical pairs (top, bottom).
+_PAIR_FIRST = np.array([4 * i + j for i in range(4) for j in range(3)] + list(range(12)))
+_PAIR_SECOND = _PAIR_FIRST + np.array([1] * 12 + [4] * 12)
+_SNAKE_REVERSED = np.array([(k // 3) % 2 == 1 for k in range(12)] + [False] * 12)
+_CORNERS = np.array([0, 3, 12, 15])
+
+_PAIR_CELLS = np.zeros((24, 16), dtype=np.int64)
+_PAIR_CELLS[np.arange(24), _PAIR_FIRST] = 1
+_PAIR_CELLS[np.arange(24), _PAIR_SECOND] = 1
+
+
+def _build_line_tables():
+    # Per-line terms of evaluate_positions for every packed 16-bit line, with
+    # their weights applied, so one board needs a lookup per row and column:
+    # line scores for even rows, odd rows and columns, the cell masks of each
+    # row and the cells of each column with an equal vertical neighbour.
+    lines = np.arange(65536)
+    cells = (lines[:, np.newaxis] >> (4 * np.arange(4))) & 0xF
+    first = cells[:, :3]
+    second = cells[:, 1:]
+
+    equal = first == second
+    merges = (first * equal * 4 + (first * (second == 0) + second * (first == 0)) * 0.5).sum(axis=1)
+    chain = np.where((first > 0) & (second - first == 1), 1 << first, 0).sum(axis=1)
+    shared = merges * 75 + chain * 0.1 * 40
+
+    # Monotonicity counts 1.5 per ordered row pair and 0.5 per ordered column
+    # pair, doubled by its weight; the constant -12 is added per board.
+    even_rows = (first >= second).sum(axis=1) * 3.0 + shared
+    odd_rows = (second >= first).sum(axis=1) * 3.0 + shared
+    columns = (first >= second).sum(axis=1) * 1.0 + shared
+
+    paired = np.zeros((65536, 4), dtype=bool)
+    paired[:, :3] |= equal
+    paired[:, 1:] |= equal
+    bits = 1 << np.arange(4)
+
+    row_cells = (
+        (cells == 0).sum(axis=1)
+        | (cells.max(axis=1) << 5)
+        | ((cells >= 3) @ bits << 9)
+        | (paired @ bits << 13)
+    )
+    column_paired = paired @ (1 << (4 * np.arange(4)))
+
+    return even_rows.tolist(), odd_rows.tolist(), columns.tolist(), row_cells.tolist(), column_paired.tolist()
+
+
+_EVEN_ROW_SCORES, _ODD_ROW_SCORES, _COLUMN_SCORES, _ROW_CELLS, _COLUMN_PAIRED = _build_line_tables()
+_FREE_CELLS_TERM = [
+    [-1000 * 150] + [math.log(free_cells + 1) * 10 * (phase + 1) * 150 for free_cells in range(1, 17)]
+    for phase in range(3)
+]
+
+
+def _exponent_grid(board):
+    # Phase rules read the (4, 4) exponent grid, so packed boards are decoded first.
+    if bitboard.is_packed(board):
+        return bitboard.from_bitboard(int(board))
+    return board
+
+
 class ImprovedStrategy(SimpleStrategy):
-    def __init__(self, debug=True):
-        super().__init__(debug)
+    def __init__(self, debug=True, tt_size_mb=64, prob_cutoff=0.02, workers=0, batch_search=False,
+                 canonical_keys=False, move_cache_path=None, move_cache_entries=1000000,
+                 opening_book_path=None):
+        super().__init__(
+            debug, tt_size_mb, prob_cutoff, workers, batch_search, canonical_keys,
+            move_cache_path, move_cache_entries, opening_book_path)
 
         self._init_weights()
 
@@ -15,8 +83,17 @@ class ImprovedStrategy(SimpleStrategy):
             'mid': self._init_mid_weights(),
             'late': self._init_late_weights()
         }
+        self._positional_weights = np.stack([
+            (self._weights * 3.0 + self._game_phase_weights[phase] * 2.0).ravel()
+            for phase in ['early', 'mid', 'late']
+        ])
+        self._phase_positional_tables = [
+            row_heuristics.build_positional_tables(weights.reshape(4, 4))
+            for weights in self._positional_weights
+        ]
 
-        self._current_phase = 'mid'
+    def _fingerprint_parts(self):
+        return super()._fingerprint_parts() + [self._positional_weights]
 
     def _init_weights(self):
         self._weights = np.array([
@@ -59,153 +136,133 @@ class ImprovedStrategy(SimpleStrategy):
             return 'late'
 
     def evaluate_position(self, board):
-        max_tile = np.max(board)
+        return self._evaluate_bitboard(bitboard.as_bitboard(board))
+
+    def evaluate_positions(self, boards):
+        exponents = np.asarray(boards).reshape(-1, 16).astype(np.int64)
+        values = (1 << exponents) * (exponents > 0)
+
+        max_exponent = exponents.max(axis=1)
+        phase = (max_exponent >= 7) + (max_exponent >= 10).astype(np.int64)
+
+        first = exponents[:, _PAIR_FIRST]
+        second = exponents[:, _PAIR_SECOND]
+
+        score = (values * self._positional_weights[phase]).sum(axis=1)
+        score += self._advanced_monotonicity(first, second) * 2.0
+        score += self._corner_max_tile_bonus(exponents, max_exponent) * 5.0
+        score += self._free_cells_bonus(exponents, phase) * 150
+        score += self._advanced_mergeability(first, second) * 75
+        score -= self._strategic_penalty(exponents, max_exponent, first, second) * 25
+        score += self._chain_bonus(first, second, values[:, _PAIR_FIRST]) * 40
 
-        self._current_phase = self.get_game_phase(max_tile)
-        phase_weights = self._game_phase_weights[self._current_phase]
+        return np.where(max_exponent >= 12, 1000000.0, score)
 
-        if max_tile >= 4096:
-            return 1000000
+    def _evaluate_bitboard(self, board):
+        # evaluate_positions for one packed board, read from per-line tables.
+        mask = bitboard.ROW_MASK
+        r0, r1, r2, r3 = board & mask, (board >> 16) & mask, (board >> 32) & mask, board >> 48
+        f0, f1, f2, f3 = _ROW_CELLS[r0], _ROW_CELLS[r1], _ROW_CELLS[r2], _ROW_CELLS[r3]
 
-        score = np.sum(board * self._weights) * 3.0
-        score += np.sum(board * phase_weights) * 2.0
-        score += self._advanced_monotonicity(board) * 2.0
-        score += self._corner_max_tile_bonus(board) * 5.0
+        max_exponent = max((f0 >> 5) & 0xF, (f1 >> 5) & 0xF, (f2 >> 5) & 0xF, (f3 >> 5) & 0xF)
+        if max_exponent >= 12:
+            return 1000000.0
+        phase = (max_exponent >= 7) + (max_exponent >= 10)
 
-        free_cells = np.sum(board == 0)
-        score += self._free_cells_bonus(free_cells, max_tile) * 150
+        t = bitboard.transpose(board)
+        c0, c1, c2, c3 = t & mask, (t >> 16) & mask, (t >> 32) & mask, t >> 48
 
-        score += self._advanced_mergeability(board) * 75
-        score -= self._strategic_penalty(board) * 25
-        score += self._chain_bonus(board) * 40
+        p0, p1, p2, p3 = self._phase_positional_tables[phase]
+        score = (
+            p0[r0] + p1[r1] + p2[r2] + p3[r3]
+            + _EVEN_ROW_SCORES[r0] + _ODD_ROW_SCORES[r1] + _EVEN_ROW_SCORES[r2] + _ODD_ROW_SCORES[r3]
+            + _COLUMN_SCORES[c0] + _COLUMN_SCORES[c1] + _COLUMN_SCORES[c2] + _COLUMN_SCORES[c3]
+        ) - 12
+
+        corners = (board & 0xF, (board >> 12) & 0xF, (board >> 48) & 0xF, board >> 60)
+        if max_exponent in corners:
+            score += max_exponent * 100 * 5.0
+
+        score += _FREE_CELLS_TERM[phase][(f0 & 0x1F) + (f1 & 0x1F) + (f2 & 0x1F) + (f3 & 0x1F)]
+
+        large = ((f0 >> 9) & 0xF) | ((f1 >> 5) & 0xF0) | ((f2 >> 1) & 0xF00) | ((f3 << 3) & 0xF000)
+        paired = (
+            ((f0 >> 13) & 0xF) | ((f1 >> 9) & 0xF0) | ((f2 >> 5) & 0xF00) | ((f3 >> 1) & 0xF000)
+            | _COLUMN_PAIRED[c0] | (_COLUMN_PAIRED[c1] << 1) | (_COLUMN_PAIRED[c2] << 2)
+            | (_COLUMN_PAIRED[c3] << 3)
+        )
+
+        small_corners = sum(1 for corner in corners if 0 < corner < max_exponent - 3)
+        score -= (small_corners * 2 + (large & ~paired).bit_count() * 1.5) * 25
 
         return score
 
-    def _advanced_monotonicity(self, board):
-        mono_score = 0
-        snake_penalty = 0
-
-        for i in range(4):
-            if i % 2 == 0:
-                for j in range(3):
-                    current = math.log2(board[i, j]) if board[i, j] > 0 else 0
-                    next_val = math.log2(board[i, j+1]) if board[i, j+1] > 0 else 0
-                    if current >= next_val:
-                        mono_score += 1
-                    else:
-                        snake_penalty += 1
-            else:
-                for j in range(3, 0, -1):
-                    current = math.log2(board[i, j]) if board[i, j] > 0 else 0
-                    next_val = math.log2(board[i, j-1]) if board[i, j-1] > 0 else 0
-                    if current >= next_val:
-                        mono_score += 1
-                    else:
-                        snake_penalty += 1
-
-        for j in range(4):
-            for i in range(3):
-                current = math.log2(board[i, j]) if board[i, j] > 0 else 0
-                next_val = math.log2(board[i+1, j]) if board[i+1, j] > 0 else 0
-                if current >= next_val:
-                    mono_score += 0.5
-
-        return mono_score - snake_penalty * 0.5
-
-    def _corner_max_tile_bonus(self, board):
-        max_tile = np.max(board)
-        corners = [(0, 0), (0, 3), (3, 0), (3, 3)]
-
-        for i, j in corners:
-            if board[i, j] == max_tile:
-                return math.log2(max_tile) * 100 if max_tile > 0 else 0
-
-        return 0
-
-    def _free_cells_bonus(self, free_cells, max_tile):
-        if free_cells == 0:
-            return -1000
-
-        base_bonus = math.log(free_cells + 1) * 10
-
-        if self._current_phase == 'late':
-            return base_bonus * 3
-        elif self._current_phase == 'mid':
-            return base_bonus * 2
-        else:
-            return base_bonus
+    def evaluate_bitboards(self, boards):
+        return self.evaluate_positions(bitboard.exponents_many(boards))
 
-    def _advanced_mergeability(self, board):
-        merge_score = 0
+    def _advanced_monotonicity(self, first, second):
+        # Snake order: even rows should decrease to the right, odd rows to the
+        # left, columns should decrease downwards.
+        ordered = np.where(_SNAKE_REVERSED, second >= first, first >= second)
 
-        for i in range(4):
-            for j in range(4):
-                if board[i, j] == 0:
-                    continue
+        mono_score = ordered[:, :12].sum(axis=1)
+        snake_penalty = 12 - mono_score
+        column_score = ordered[:, 12:].sum(axis=1) * 0.5
 
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    ni, nj = i + dx, j + dy
-                    if 0 <= ni < 4 and 0 <= nj < 4:
-                        if board[ni, nj] == board[i, j]:
-                            merge_score += math.log2(board[i, j]) * 2
+        return mono_score + column_score - snake_penalty * 0.5
 
-                        elif board[ni, nj] == 0:
-                            merge_score += math.log2(board[i, j]) * 0.5
+    def _corner_max_tile_bonus(self, exponents, max_exponent):
+        in_corner = (exponents[:, _CORNERS] == max_exponent[:, np.newaxis]).any(axis=1)
 
-        return merge_score
+        return max_exponent * 100 * in_corner
 
-    def _strategic_penalty(self, board):
-        penalty = 0
+    def _free_cells_bonus(self, exponents, phase):
+        free_cells = (exponents == 0).sum(axis=1)
+        base_bonus = np.log(free_cells + 1) * 10
 
-        corners = [(0, 0), (0, 3), (3, 0), (3, 3)]
-        max_tile = np.max(board)
+        return np.where(free_cells == 0, -1000, base_bonus * (phase + 1))
 
-        for i, j in corners:
-            if board[i, j] > 0 and board[i, j] < max_tile / 8:
-                penalty += 2
+    def _advanced_mergeability(self, first, second):
+        # Every pair of neighbours is seen from both tiles: equal tiles score
+        # 2 * log2 each, a tile next to an empty cell scores 0.5 * log2.
+        equal = first * (first == second) * 4
+        next_to_empty = (first * (second == 0) + second * (first == 0)) * 0.5
 
-        penalty += self._isolation_penalty(board) * 1.5
+        return (equal + next_to_empty).sum(axis=1)
 
-        return penalty
+    def _strategic_penalty(self, exponents, max_exponent, first, second):
+        corners = exponents[:, _CORNERS]
+        small_corners = (corners > 0) & (corners < max_exponent[:, np.newaxis] - 3)
 
-    def _chain_bonus(self, board):
-        chain_bonus = 0
+        has_equal_neighbour = (first == second).astype(np.int64) @ _PAIR_CELLS > 0
+        isolated = (exponents >= 3) & ~has_equal_neighbour
 
-        for i in range(4):
-            for j in range(3):
-                if (
-                    board[i, j] > 0 and board[i, j+1] > 0 and
-                    math.log2(board[i, j+1]) - math.log2(board[i, j]) == 1
-                ):
-                    chain_bonus += board[i, j] * 0.1
+        return small_corners.sum(axis=1) * 2 + isolated.sum(axis=1) * 1.5
 
-        for j in range(4):
-            for i in range(3):
-                if (
-                    board[i, j] > 0 and board[i+1, j] > 0 and
-                    math.log2(board[i+1, j]) - math.log2(board[i, j]) == 1
-                ):
-                    chain_bonus += board[i, j] * 0.1
+    def _chain_bonus(self, first, second, first_values):
+        chain = (first > 0) & (second - first == 1)
 
-        return chain_bonus
+        return (first_values * chain).sum(axis=1) * 0.1
 
-    def find_best_move(self, board, next_tile=None, depth=None):
-        free_cells = np.sum(board == 0)
+    def find_best_move(self, board, next_tile=None, depth=None, time_budget=None):
+        exponents = _exponent_grid(board)
+        free_cells = np.sum(exponents == 0)
+        phase = self.get_game_phase(bitboard.tile_value(np.max(exponents)))
 
-        if depth is None:
-            if self._current_phase == 'late' and free_cells <= 4:
+        if depth is None and time_budget is None:
+            if phase == 'late' and free_cells <= 4:
                 depth = 4
-            elif self._current_phase == 'mid':
+            elif phase == 'mid':
                 depth = 3
             else:
                 depth = 3
 
-        return super().find_best_move(board, next_tile, depth)
+        return super().find_best_move(board, next_tile, depth, time_budget)
 
     def find_aggressive_move(self, board):
-        max_tile = np.max(board)
+        max_exponent = np.max(_exponent_grid(board))
 
-        if max_tile >= 1024:
+        if max_exponent >= bitboard.tile_exponent(1024):
             _, best_move = self.find_best_move(board, depth=3)
         else:
             _, best_move = self.find_best_move(board, depth=2)
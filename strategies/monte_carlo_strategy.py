@@ -0,0 +1,193 @@
+import numpy as np
+import time
+
+from strategies import bitboard
+from strategies.base_strategy import BaseStrategy
+from strategies.parallel_search import ParallelSearch
+
+
+MOVES = ['left', 'right', 'up', 'down']
+PLAYOUT_POLICIES = ['random', 'greedy']
+
+
+def spawn_many(boards, rng):
+    # Same spawn rule as GameEnvironment for every board of the batch: 2 (90%)
+    # or 4 (10%) on a uniformly chosen empty cell. Boards must have one.
+    empty = bitboard.exponents_many(boards) == 0
+    keys = rng.random(empty.shape)
+    keys[~empty] = -1.0
+    cells = keys.argmax(axis=1).astype(np.uint64)
+
+    tiles = np.where(rng.random(len(boards)) < 0.1, 2, 1).astype(np.uint64)
+    return boards | (tiles << (cells * np.uint64(4)))
+
+
+def run_playouts(boards, rng, policy='random', max_moves=None):
+    # Plays every board of the batch to the end in lockstep: each step moves and
+    # spawns on all boards that are still alive. Returns the merge score every
+    # playout collected and the total number of moves played.
+    boards = boards.copy()
+    scores = np.zeros(len(boards))
+    alive = np.arange(len(boards))
+    moves = 0
+    steps = 0
+
+    while len(alive) and (max_moves is None or steps < max_moves):
+        current = boards[alive]
+        moved = np.stack([bitboard.move_many(current, move) for move in MOVES], axis=1)
+        rewards = np.stack([bitboard.move_score_many(current, move) for move in MOVES], axis=1)
+        legal = moved != current[:, np.newaxis]
+
+        playing = legal.any(axis=1)
+        if not playing.all():
+            alive, current = alive[playing], current[playing]
+            moved, rewards, legal = moved[playing], rewards[playing], legal[playing]
+            if not len(alive):
+                break
+
+        # Random keys in [0, 1) break ties between the best greedy moves.
+        keys = rng.random(legal.shape)
+        if policy == 'greedy':
+            keys += rewards
+        keys[~legal] = -1.0
+        choice = keys.argmax(axis=1)
+
+        rows = np.arange(len(alive))
+        scores[alive] += rewards[rows, choice]
+        boards[alive] = spawn_many(moved[rows, choice], rng)
+
+        moves += len(alive)
+        steps += 1
+
+    return scores, moves
+
+
+class MonteCarloStrategy(BaseStrategy):
+    # Scores every root move by the mean merge score of many playouts from its
+    # afterstate. All playouts of a decision run as one NumPy batch, so there
+    # is no hand-tuned evaluation and strength grows with the playout count.
+    def __init__(self, debug=True, playouts=100, playout_policy='random', max_playout_moves=None,
+                 workers=0, seed=None):
+        super().__init__(debug)
+
+        if playout_policy not in PLAYOUT_POLICIES:
+            raise ValueError(f'Unknown playout policy: {playout_policy}')
+
+        self._playouts = playouts
+        self._policy = playout_policy
+        self._max_playout_moves = max_playout_moves
+        self._workers = workers
+        self._parallel = None
+        self._seed = seed
+        self._rng = np.random.default_rng(seed)
+
+        self._playout_count = 0
+        self._playout_moves = 0
+        self._playout_time = 0.0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_workers'] = 0
+        state['_parallel'] = None
+        return state
+
+    def new_game(self):
+        # A seeded strategy replays the same playouts in every game it starts.
+        self._rng = np.random.default_rng(self._seed)
+
+    def close(self):
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+    def pop_search_stats(self):
+        stats = {'playouts': self._playout_count, 'playout_moves': self._playout_moves}
+        if self._playout_time > 0:
+            stats['playouts_per_sec'] = self._playout_count / self._playout_time
+
+        self._playout_count = 0
+        self._playout_moves = 0
+        self._playout_time = 0.0
+
+        return stats
+
+    def evaluate_position(self, board):
+        board = bitboard.as_bitboard(board)
+
+        if bitboard.is_game_over(board):
+            return 0.0
+
+        boards = np.full(self._playouts, board, dtype=np.uint64)
+        return float(self._simulate(boards).mean())
+
+    def find_best_move(self, board, next_tile=None, depth=None, time_budget=None):
+        # `depth` is accepted for the Solver interface; the search size is set
+        # by the playout count, or by the time budget when one is given.
+        board = bitboard.as_bitboard(board)
+
+        root_moves = []
+        for move in MOVES:
+            new_board = bitboard.move(board, move)
+            if new_board != board:
+                root_moves.append((move, new_board, bitboard.move_score(board, move)))
+
+        if not root_moves:
+            return -float('inf'), 'left'
+
+        afters = np.array([new_board for _, new_board, _ in root_moves], dtype=np.uint64)
+        totals = np.zeros(len(root_moves))
+        rounds = 0
+
+        start_time = time.perf_counter()
+        deadline = start_time + time_budget if time_budget is not None else None
+
+        while True:
+            round_start = time.perf_counter()
+            boards = spawn_many(np.repeat(afters, self._playouts), self._rng)
+            totals += self._simulate(boards).reshape(len(root_moves), self._playouts).sum(axis=1)
+            rounds += 1
+
+            # Like iterative deepening: stop when another round of the same
+            # size would not finish inside the budget.
+            now = time.perf_counter()
+            if deadline is None or deadline - now < now - round_start:
+                break
+
+        best_score = -float('inf')
+        best_move = 'left'
+
+        for (move, _, reward), total in zip(root_moves, totals):
+            expected_score = reward + float(total) / (rounds * self._playouts)
+            if expected_score > best_score:
+                best_score = expected_score
+                best_move = move
+
+        return best_score, best_move
+
+    def _simulate(self, boards):
+        start_time = time.perf_counter()
+
+        if self._workers > 1 and len(boards) >= 2 * self._workers:
+            if self._parallel is None:
+                self._parallel = ParallelSearch(self, self._workers)
+
+            # Every worker plays a slice of the batch with its own seed drawn
+            # from this strategy's generator, so seeded runs stay reproducible.
+            seeds = self._rng.integers(0, 2 ** 63, size=self._workers)
+            tasks = list(zip(np.array_split(boards, self._workers), seeds.tolist()))
+            results = self._parallel.map(tasks)
+
+            scores = np.concatenate([result[0] for result in results])
+            moves = sum(result[1] for result in results)
+        else:
+            scores, moves = run_playouts(boards, self._rng, self._policy, self._max_playout_moves)
+
+        self._playout_count += len(boards)
+        self._playout_moves += moves
+        self._playout_time += time.perf_counter() - start_time
+
+        return scores
+
+    def _run_worker_task(self, task):
+        boards, seed = task
+        return run_playouts(boards, np.random.default_rng(seed), self._policy, self._max_playout_moves)
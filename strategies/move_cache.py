@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import time
+
+
+class MoveCache:
+    # Search results kept on disk in SQLite, keyed by (strategy fingerprint,
+    # packed board, depth), so they survive restarts and are shared by every
+    # process that opens the same file. A fingerprint changes with the
+    # strategy's weights and settings, so stale results are never returned;
+    # they age out through the LRU size cap instead.
+    EVICTION_CHECK_EVERY = 1000
+    # Hits only refresh the LRU time, so they are written in batches.
+    USED_FLUSH_EVERY = 256
+
+    def __init__(self, path, fingerprint, max_entries=1000000):
+        self._path = path
+        self._fingerprint = fingerprint
+        self._max_entries = max_entries
+        self._connection = None
+        self._puts = 0
+        self._used = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._connect()
+        self._evict()
+
+    def _connect(self):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Autocommit with WAL: readers never block the writer, and other
+        # processes see every result as soon as it is stored.
+        self._connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS moves ('
+            'fingerprint TEXT NOT NULL, board INTEGER NOT NULL, depth INTEGER NOT NULL, '
+            'score REAL NOT NULL, move TEXT NOT NULL, used REAL NOT NULL, '
+            'PRIMARY KEY (fingerprint, board, depth)) WITHOUT ROWID')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS moves_used ON moves (used)')
+
+        # Triggers keep the entry count of the file in one row, so the size
+        # cap never needs a COUNT(*). Files from before it are counted once.
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS stats (entries INTEGER NOT NULL)')
+            self._connection.execute(
+                'INSERT INTO stats SELECT COUNT(*) FROM moves WHERE NOT EXISTS (SELECT 1 FROM stats)')
+            self._connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS moves_insert AFTER INSERT ON moves '
+                'BEGIN UPDATE stats SET entries = entries + 1; END')
+            self._connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS moves_delete AFTER DELETE ON moves '
+                'BEGIN UPDATE stats SET entries = entries - 1; END')
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _board_key(board):
+        # SQLite integers are signed 64-bit.
+        return board - (1 << 64) if board >= 1 << 63 else board
+
+    def get(self, board, depth):
+        row = self._connection.execute(
+            'SELECT score, move FROM moves WHERE fingerprint = ? AND board = ? AND depth = ?',
+            (self._fingerprint, self._board_key(board), depth)).fetchone()
+
+        if row is None:
+            self._misses += 1
+            return None
+
+        self._used[(self._board_key(board), depth)] = time.time()
+        if len(self._used) >= self.USED_FLUSH_EVERY:
+            self._flush_used()
+        self._hits += 1
+
+        return row[0], row[1]
+
+    def _flush_used(self):
+        if not self._used:
+            return
+
+        # One transaction for the whole batch; rows evicted meanwhile are skipped.
+        self._connection.execute('BEGIN')
+        try:
+            self._connection.executemany(
+                'UPDATE moves SET used = ? WHERE fingerprint = ? AND board = ? AND depth = ?',
+                [(used, self._fingerprint, board, depth) for (board, depth), used in self._used.items()])
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._used.clear()
+
+    def put(self, board, depth, score, move):
+        # An upsert rather than INSERT OR REPLACE: a replaced row fires no
+        # delete trigger, so the entry count would drift.
+        self._connection.execute(
+            'INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint, board, depth) '
+            'DO UPDATE SET score = excluded.score, move = excluded.move, used = excluded.used',
+            (self._fingerprint, self._board_key(board), depth, score, move, time.time()))
+
+        self._puts += 1
+        if self._puts % self.EVICTION_CHECK_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        # Trim to 90% of the cap at once, so eviction runs rarely.
+        count = len(self)
+        if count <= self._max_entries:
+            return
+
+        # Recent hits first, so they count when picking the oldest entries.
+        self._flush_used()
+        excess = count - int(self._max_entries * 0.9)
+        self._connection.execute(
+            'DELETE FROM moves WHERE (fingerprint, board, depth) IN '
+            '(SELECT fingerprint, board, depth FROM moves ORDER BY used LIMIT ?)', (excess,))
+        self._evictions += excess
+
+    def __len__(self):
+        return self._connection.execute('SELECT entries FROM stats').fetchone()[0]
+
+    def pop_stats(self):
+        lookups = self._hits + self._misses
+
+        stats = {
+            'move_cache_hits': self._hits,
+            'move_cache_misses': self._misses,
+            'move_cache_evictions': self._evictions
+        }
+        if lookups > 0:
+            stats['move_cache_hit_rate'] = self._hits / lookups
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        return stats
+
+    def close(self):
+        if self._connection is not None:
+            self._flush_used()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,82 @@
+import numpy as np
+import os
+
+from strategies import bitboard
+
+
+# Four 6-cell patterns over the row-major cell indices 0..15, each looked up
+# under the 8 board symmetries. Every pattern owns a table of 16 ** 6 weights
+# indexed by the tile exponents of its cells.
+TUPLES = [
+    [0, 1, 2, 3, 4, 5],
+    [4, 5, 6, 7, 8, 9],
+    [0, 1, 2, 4, 5, 6],
+    [4, 5, 6, 8, 9, 10]
+]
+TUPLE_SIZE = 6
+TABLE_SIZE = 16 ** TUPLE_SIZE
+
+
+def _symmetries():
+    cells = np.arange(16).reshape(4, 4)
+    transforms = []
+    for board in [cells, cells.T]:
+        for k in range(4):
+            transforms.append(np.rot90(board, k).ravel())
+    return transforms
+
+
+# SYMMETRIC_CELLS[8 * t + s] lists the board cells read by tuple t under symmetry s.
+SYMMETRIC_CELLS = np.array([sym[cells] for cells in TUPLES for sym in _symmetries()])
+FEATURES = len(SYMMETRIC_CELLS)
+
+_PLACE_VALUES = 16 ** np.arange(TUPLE_SIZE - 1, -1, -1, dtype=np.int64)
+
+
+def _index_matrix():
+    # Feature indices are a linear map of the 16 exponents: column f holds the
+    # place value of every cell read by feature f.
+    matrix = np.zeros((16, FEATURES), dtype=np.int64)
+    for feature, cells in enumerate(SYMMETRIC_CELLS):
+        matrix[cells, feature] = _PLACE_VALUES
+    return matrix
+
+
+_INDEX_MATRIX = _index_matrix()
+_TABLE_OFFSETS = np.repeat(np.arange(len(TUPLES), dtype=np.int64) * TABLE_SIZE, 8)
+
+
+def create_weights(path):
+    weights = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(TUPLES), TABLE_SIZE))
+    weights.flush()
+    return weights
+
+
+def load_weights(path, writable=False):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'N-tuple weights not found: {path}. Train them with train_ntuple.py first.')
+
+    weights = np.load(path, mmap_mode='r+' if writable else 'r')
+
+    if weights.shape != (len(TUPLES), TABLE_SIZE):
+        raise ValueError(f'Weights in {path} have shape {weights.shape}, expected {(len(TUPLES), TABLE_SIZE)}')
+
+    return weights
+
+
+def board_exponents(board):
+    return np.array([(board >> shift) & 0xF for shift in bitboard._SHIFTS], dtype=np.int64)
+
+
+def feature_indices(exponents):
+    # Flat indices into the (tuples * TABLE_SIZE) weight array; works on one
+    # board of 16 exponents or on a stack of shape (N, 16).
+    return exponents @ _INDEX_MATRIX + _TABLE_OFFSETS
+
+
+def evaluate(flat_weights, board):
+    return float(flat_weights[feature_indices(board_exponents(board))].sum(dtype=np.float64))
+
+
+def evaluate_many(flat_weights, exponents):
+    return flat_weights[feature_indices(exponents)].sum(axis=-1, dtype=np.float64)
@@ -0,0 +1,60 @@
+import numpy as np
+import os
+
+from strategies import bitboard, ntuple_network
+from strategies.simple_strategy import SimpleStrategy
+
+
+DEFAULT_WEIGHTS_PATH = 'ntuple_weights.npy'
+
+
+class NTupleStrategy(SimpleStrategy):
+    # Expectimax driven by an n-tuple network instead of hand-tuned terms. The
+    # weight tables are memory-mapped read-only: loading is instant and every
+    # process on the machine shares the same pages.
+    SYMMETRIC_EVALUATION = True
+
+    def __init__(self, debug=True, tt_size_mb=64, prob_cutoff=0.02, workers=0, batch_search=False,
+                 canonical_keys=False, move_cache_path=None, move_cache_entries=1000000,
+                 opening_book_path=None, weights_path=DEFAULT_WEIGHTS_PATH):
+        super().__init__(
+            debug, tt_size_mb, prob_cutoff, workers, batch_search, canonical_keys,
+            move_cache_path, move_cache_entries, opening_book_path)
+
+        self._weights_path = weights_path
+        self._load_weights()
+
+    def _load_weights(self):
+        self._network_weights = ntuple_network.load_weights(self._weights_path)
+        # Plain ndarray view of the mapping: indexing skips the memmap subclass overhead.
+        self._flat_weights = np.asarray(self._network_weights).reshape(-1)
+
+    def __getstate__(self):
+        # Worker processes map the file themselves instead of receiving a copy.
+        state = super().__getstate__()
+        state['_network_weights'] = None
+        state['_flat_weights'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_weights()
+
+    def _fingerprint_parts(self):
+        # Training rewrites the file, which changes its size or modification time.
+        stat = os.stat(self._weights_path)
+        return super()._fingerprint_parts() + [
+            os.path.abspath(self._weights_path), stat.st_size, stat.st_mtime_ns]
+
+    def evaluate_position(self, board):
+        return self._evaluate_bitboard(bitboard.as_bitboard(board))
+
+    def evaluate_positions(self, boards):
+        exponents = np.asarray(boards).reshape(-1, 16).astype(np.int64)
+        return ntuple_network.evaluate_many(self._flat_weights, exponents)
+
+    def evaluate_bitboards(self, boards):
+        return ntuple_network.evaluate_many(self._flat_weights, bitboard.exponents_many(boards).astype(np.int64))
+
+    def _evaluate_bitboard(self, board):
+        return ntuple_network.evaluate(self._flat_weights, board)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from strategies import batch_search, bitboard
+
+
+MOVES = batch_search.MOVES
+
+
+def _spawn_layer(boards, probs, min_prob):
+    # Every spawn outcome of every board, with the probability of reaching it.
+    # Boards reached along several paths are merged and their probabilities added.
+    children, child_probs, _, _ = batch_search.expand_chance(boards, probs)
+    children, inverse = np.unique(children, return_inverse=True)
+    child_probs = np.bincount(inverse, weights=child_probs)
+
+    keep = child_probs >= min_prob
+    return children[keep], child_probs[keep]
+
+
+def build_book(strategy, moves=3, depth=5, min_prob=1e-6, chunk_size=64, progress=None):
+    # Plays the strategy's own moves from every opening position: each layer
+    # holds the boards it can face before its next move, searched together
+    # with find_best_moves. Boards less likely than `min_prob` are dropped.
+    positions, probs = _spawn_layer(np.zeros(1, dtype=np.uint64), np.ones(1), 0.0)
+    positions, probs = _spawn_layer(positions, probs, min_prob)
+
+    layers = []
+    for ply in range(moves):
+        scores, best = strategy.find_best_moves(positions, depth, chunk_size)
+        live = np.isfinite(scores)
+        codes = (best[:, np.newaxis] == np.array(MOVES)).argmax(axis=1)
+
+        positions, probs, scores, codes = positions[live], probs[live], scores[live], codes[live]
+        layers.append((positions, scores, codes))
+
+        if progress is not None:
+            progress(ply + 1, len(positions))
+
+        if ply + 1 < moves:
+            moved = np.stack([bitboard.move_many(positions, move) for move in MOVES], axis=1)
+            positions, probs = _spawn_layer(moved[np.arange(len(positions)), codes], probs, min_prob)
+
+    boards = np.concatenate([layer[0] for layer in layers])
+    boards, index = np.unique(boards, return_index=True)
+
+    return {
+        'boards': boards,
+        'scores': np.concatenate([layer[1] for layer in layers])[index],
+        'moves': np.concatenate([layer[2] for layer in layers])[index].astype(np.uint8),
+        'depth': depth,
+        'fingerprint': strategy.cache_fingerprint()
+    }
+
+
+def save_book(path, book):
+    np.savez_compressed(path, **book)
+
+
+class OpeningBook:
+    # Best moves of the boards a strategy meets in its first moves, found
+    # offline by deep searches (build_opening_book.py). Entries sit in a dict
+    # keyed by packed board, so a lookup costs one hash probe.
+    def __init__(self, path):
+        data = np.load(path)
+
+        self.fingerprint = str(data['fingerprint'])
+        self.depth = int(data['depth'])
+
+        boards = data['boards']
+        moves = [MOVES[code] for code in data['moves'].tolist()]
+        self._entries = dict(zip(boards.tolist(), zip(data['scores'].tolist(), moves)))
+
+        # Every move adds one tile, so the tile sum tells when a game has left
+        # the book and lookups can stop counting as misses.
+        self._max_tile_sum = max((bitboard.tile_sum(board) for board in self._entries), default=0)
+
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, board):
+        if bitboard.tile_sum(board) > self._max_tile_sum:
+            return None
+
+        entry = self._entries.get(board)
+        if entry is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+
+        return entry
+
+    def pop_stats(self):
+        lookups = self._hits + self._misses
+
+        stats = {'book_hits': self._hits, 'book_misses': self._misses}
+        if lookups > 0:
+            stats['book_hit_rate'] = self._hits / lookups
+
+        self._hits = 0
+        self._misses = 0
+
+        return stats
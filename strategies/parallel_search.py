@@ -0,0 +1,31 @@
+import multiprocessing
+
+
+_worker_strategy = None
+
+
+def _init_worker(strategy):
+    global _worker_strategy
+    _worker_strategy = strategy
+
+
+def _run_task(task):
+    return _worker_strategy._run_worker_task(task)
+
+
+class ParallelSearch:
+    # Long-lived pool: every worker builds its own copy of the strategy (and its
+    # transposition table) once, then serves search tasks for the whole session.
+    def __init__(self, strategy, workers):
+        self._pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(strategy,)
+        )
+
+    def map(self, tasks):
+        return self._pool.map(_run_task, tasks, chunksize=1)
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
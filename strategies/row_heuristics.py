@@ -0,0 +1,147 @@
+import numpy as np
+
+from strategies import bitboard
+
+
+# Per-row heuristic features for every packed 16-bit row, folded into one
+# integer so that a board needs one lookup per row and one per column.
+# Row and column entries can be summed without carries between fields:
+#
+#   bits  0-5   monotonicity + 3 of the line (rows and columns)
+#   bits  6-10  adjacent equal tiles in the line (rows and columns)
+#   bits 11-15  empty cells (rows only)
+#   bits 16-20  tiles of 4096 or more (rows only)
+#   bits 21-36  tiles of 8 or more without an equal left/right neighbour (rows only)
+#   bits 37-52  tiles with an equal up/down neighbour (columns only)
+
+MONO_OFFSET = 3
+LINES = 8
+
+_MERGES_SHIFT = 6
+_EMPTY_SHIFT = 11
+_WIN_SHIFT = 16
+_ISOLATED_SHIFT = 21
+_PAIRED_SHIFT = 37
+
+ISOLATION_MIN_EXPONENT = 3
+WIN_EXPONENT = 12
+
+
+def _line_features(cells):
+    mono = 0
+    merges = 0
+    paired = [False] * 4
+
+    for j in range(3):
+        if cells[j] > cells[j + 1]:
+            mono += 1
+        elif cells[j] < cells[j + 1]:
+            mono -= 1
+
+        if cells[j] != 0 and cells[j] == cells[j + 1]:
+            merges += 1
+            paired[j] = True
+            paired[j + 1] = True
+
+    return mono, merges, paired
+
+
+def _build_tables():
+    row_tables = [[0] * 65536 for _ in range(4)]
+    col_tables = [[0] * 65536 for _ in range(4)]
+
+    for row in range(65536):
+        cells = [(row >> (4 * j)) & 0xF for j in range(4)]
+        mono, merges, paired = _line_features(cells)
+
+        line = (mono + MONO_OFFSET) | (merges << _MERGES_SHIFT)
+
+        empty = sum(1 for cell in cells if cell == 0)
+        wins = sum(1 for cell in cells if cell >= WIN_EXPONENT)
+        isolated = sum(
+            1 << j for j in range(4)
+            if cells[j] >= ISOLATION_MIN_EXPONENT and not paired[j]
+        )
+        paired_mask = sum(1 << (4 * k) for k in range(4) if paired[k])
+
+        row_features = line | (empty << _EMPTY_SHIFT) | (wins << _WIN_SHIFT)
+
+        for i in range(4):
+            row_tables[i][row] = row_features | (isolated << (_ISOLATED_SHIFT + 4 * i))
+            col_tables[i][row] = line | (paired_mask << (_PAIRED_SHIFT + i))
+
+    return row_tables, col_tables
+
+
+ROW_TABLES, COL_TABLES = _build_tables()
+ROW_TABLE_ARRAYS = [np.array(table, dtype=np.int64) for table in ROW_TABLES]
+COL_TABLE_ARRAYS = [np.array(table, dtype=np.int64) for table in COL_TABLES]
+
+
+def build_positional_tables(weights):
+    rows = np.arange(65536)
+    exponents = (rows[:, None] >> (4 * np.arange(4))) & 0xF
+    values = np.where(exponents > 0, 1 << exponents, 0)
+
+    return [(values @ weights[i]).tolist() for i in range(4)]
+
+
+def board_features(board):
+    mask = bitboard.ROW_MASK
+    t = bitboard.transpose(board)
+
+    return (
+        ROW_TABLES[0][board & mask]
+        + ROW_TABLES[1][(board >> 16) & mask]
+        + ROW_TABLES[2][(board >> 32) & mask]
+        + ROW_TABLES[3][(board >> 48) & mask]
+        + COL_TABLES[0][t & mask]
+        + COL_TABLES[1][(t >> 16) & mask]
+        + COL_TABLES[2][(t >> 32) & mask]
+        + COL_TABLES[3][(t >> 48) & mask]
+    )
+
+
+def board_features_many(boards):
+    # board_features for a uint64 array of packed boards.
+    mask = bitboard.ROW_MASK
+    t = bitboard.transpose(boards)
+
+    return (
+        ROW_TABLE_ARRAYS[0][boards & mask]
+        + ROW_TABLE_ARRAYS[1][(boards >> 16) & mask]
+        + ROW_TABLE_ARRAYS[2][(boards >> 32) & mask]
+        + ROW_TABLE_ARRAYS[3][(boards >> 48) & mask]
+        + COL_TABLE_ARRAYS[0][t & mask]
+        + COL_TABLE_ARRAYS[1][(t >> 16) & mask]
+        + COL_TABLE_ARRAYS[2][(t >> 32) & mask]
+        + COL_TABLE_ARRAYS[3][(t >> 48) & mask]
+    )
+
+
+def monotonicity(features):
+    return (features & 0x3F) - MONO_OFFSET * LINES
+
+
+def merges(features):
+    return (features >> _MERGES_SHIFT) & 0x1F
+
+
+def empty_cells(features):
+    return (features >> _EMPTY_SHIFT) & 0x1F
+
+
+def has_win_tile(features):
+    return (features >> _WIN_SHIFT) & 0x1F != 0
+
+
+def isolated_tiles(features):
+    isolated = (features >> _ISOLATED_SHIFT) & 0xFFFF
+    paired = (features >> _PAIRED_SHIFT) & 0xFFFF
+    return (isolated & ~paired).bit_count()
+
+
+def isolated_tiles_many(features):
+    isolated = (features >> _ISOLATED_SHIFT) & 0xFFFF
+    paired = (features >> _PAIRED_SHIFT) & 0xFFFF
+    return np.bitwise_count(isolated & ~paired)
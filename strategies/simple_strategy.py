@@ -1,15 +1,63 @@
+import hashlib
 import math
 import numpy as np
+import time
 
+from strategies import batch_search, bitboard, row_heuristics
 from strategies.base_strategy import BaseStrategy
+from strategies.move_cache import MoveCache
+from strategies.opening_book import OpeningBook
+from strategies.parallel_search import ParallelSearch
+from strategies.transposition_table import TranspositionTable
+
+
+_FREE_CELL_BONUS = [0] + [math.log(free_cells) * 100 for free_cells in range(1, 17)]
+# Same terms with the full board penalty in place of the bonus for no free cells.
+_FREE_CELL_TERM = np.array([-10000.0] + _FREE_CELL_BONUS[1:])
 
 
 class SimpleStrategy(BaseStrategy):
-    def __init__(self, debug=True):
+    # Whether the evaluation gives every rotation and reflection of a board the
+    # same score. Only then can caches be keyed on the canonical board.
+    SYMMETRIC_EVALUATION = False
+
+    # Part of the move cache fingerprint: bump it when a code change alters
+    # search results, so results stored by older code are not reused.
+    CACHE_VERSION = 1
+
+    def __init__(self, debug=True, tt_size_mb=64, prob_cutoff=0.02, workers=0, batch_search=False,
+                 canonical_keys=False, move_cache_path=None, move_cache_entries=1000000,
+                 opening_book_path=None):
         super().__init__(debug)
 
+        if canonical_keys and not self.SYMMETRIC_EVALUATION:
+            raise ValueError(
+                f'{type(self).__name__} evaluation is not symmetric, canonical keys would change its scores')
+
         self._weights = None
         self._init_weights()
+        self._positional_tables = row_heuristics.build_positional_tables(self._weights)
+        self._positional_arrays = np.array(self._positional_tables)
+
+        self._tt_size_mb = tt_size_mb
+        self._tt = TranspositionTable(tt_size_mb) if tt_size_mb else None
+        self._prob_cutoff = prob_cutoff
+        self._workers = workers
+        self._batch_search = batch_search
+        self._canonical_keys = canonical_keys
+        self._move_cache_path = move_cache_path
+        self._move_cache_entries = move_cache_entries
+        self._move_cache = None
+        self._opening_book_path = opening_book_path
+        self._opening_book = None
+        self._parallel = None
+        self._nodes = 0
+        self._cutoffs = 0
+        self._deadline = None
+        self._last_depth = None
+        self._root_scores = {}
+        self._eval_cache_hits = 0
+        self._eval_cache_misses = 0
 
     def _init_weights(self):
         self._weights = np.array([
@@ -20,95 +68,389 @@ class SimpleStrategy(BaseStrategy):
         ])
 
     def evaluate_position(self, board):
-        if np.max(board) >= 4096:
-            return 1000000
+        return self._evaluate_bitboard(bitboard.as_bitboard(board))
+
+    def evaluate_bitboards(self, boards):
+        # _evaluate_bitboard for a uint64 array of packed boards, term by term
+        # in the same order, so every score is bit-identical.
+        features = row_heuristics.board_features_many(boards)
+
+        mask = bitboard.ROW_MASK
+        positional = self._positional_arrays
+
+        score = (
+            positional[0][boards & mask]
+            + positional[1][(boards >> 16) & mask]
+            + positional[2][(boards >> 32) & mask]
+            + positional[3][(boards >> 48) & mask]
+        ) * 2.0
+        score += np.abs(row_heuristics.monotonicity(features)) * 1.5
+        score += _FREE_CELL_TERM[row_heuristics.empty_cells(features)]
+        score += row_heuristics.merges(features) * 50
+        score -= row_heuristics.isolated_tiles_many(features) * 10
+
+        return np.where(row_heuristics.has_win_tile(features), 1000000.0, score)
+
+    def __getstate__(self):
+        # Worker processes get a fresh table and never start pools of their own.
+        state = self.__dict__.copy()
+        state['_tt'] = TranspositionTable(self._tt_size_mb) if self._tt_size_mb else None
+        state['_workers'] = 0
+        state['_parallel'] = None
+        state['_move_cache'] = None
+        state['_opening_book'] = None
+        return state
+
+    def cache_fingerprint(self):
+        digest = hashlib.sha1()
+        for part in self._fingerprint_parts():
+            digest.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+        return digest.hexdigest()
+
+    def _fingerprint_parts(self):
+        # Everything that can change a search result besides the board and depth.
+        return [type(self).__name__, self.CACHE_VERSION, self._prob_cutoff, self._canonical_keys, self._weights]
+
+    def _get_move_cache(self):
+        # Opened on first use, once subclasses have set up their evaluation.
+        if self._move_cache is None and self._move_cache_path:
+            self._move_cache = MoveCache(
+                self._move_cache_path, self.cache_fingerprint(), self._move_cache_entries)
+        return self._move_cache
+
+    def _get_opening_book(self):
+        if self._opening_book is None and self._opening_book_path:
+            opening_book = OpeningBook(self._opening_book_path)
+            if opening_book.fingerprint != self.cache_fingerprint():
+                raise ValueError(
+                    f'Opening book {self._opening_book_path} was built for another strategy or settings')
+            self._opening_book = opening_book
+        return self._opening_book
+
+    def new_game(self):
+        if self._tt is not None:
+            self._tt.clear()
+
+    def close(self):
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+        if self._move_cache is not None:
+            self._move_cache.close()
+            self._move_cache = None
+
+    def pop_search_stats(self):
+        stats = {'search_nodes': self._nodes, 'prob_cutoffs': self._cutoffs}
+        self._nodes = 0
+        self._cutoffs = 0
+
+        if self._eval_cache_hits or self._eval_cache_misses:
+            stats['eval_cache_hits'] = self._eval_cache_hits
+            stats['eval_cache_misses'] = self._eval_cache_misses
+            self._eval_cache_hits = 0
+            self._eval_cache_misses = 0
+
+        if self._last_depth is not None:
+            stats['search_depth'] = self._last_depth
+            self._last_depth = None
+
+        if self._tt is not None:
+            stats.update(self._tt.pop_stats())
+
+        if self._move_cache is not None:
+            stats.update(self._move_cache.pop_stats())
+
+        if self._opening_book is not None:
+            stats.update(self._opening_book.pop_stats())
+
+        return stats
+
+    def find_best_move(self, board, next_tile=None, depth=3, time_budget=None):
+        board = bitboard.as_bitboard(board)
+
+        # Book moves come from deeper searches than any depth or budget used in play.
+        opening_book = self._get_opening_book()
+        if opening_book is not None:
+            entry = opening_book.get(board)
+            if entry is not None:
+                return entry
+
+        if time_budget is not None:
+            best_score, best_move, _ = self.iterative_deepening(board, time_budget)
+            return best_score, best_move
+
+        move_cache = self._get_move_cache()
+        if move_cache is not None:
+            cached = move_cache.get(board, depth)
+            if cached is not None:
+                return cached
+
+        best_score, best_move = self._search_root(board, depth)
+
+        if move_cache is not None:
+            move_cache.put(board, depth, best_score, best_move)
 
-        score = np.sum(board * self._weights) * 2.0
-        score += self._monotonicity(board) * 1.5
+        return best_score, best_move
 
-        free_cells = np.sum(board == 0)
-        if free_cells == 0:
-            score -= 10000
-        else:
-            score += math.log(free_cells) * 100
+    def find_best_moves(self, boards, depth=3, chunk_size=64):
+        # Searches a whole stack of boards, `chunk_size` roots per pass. Every
+        # pass shares its transpositions across all of its roots, and the leaf
+        # evaluations are shared by all passes. Scores and moves are the ones
+        # find_best_move returns for each board at this depth.
+        if not isinstance(boards, np.ndarray) or boards.dtype != np.uint64:
+            boards = np.asarray(boards)
+            if boards.ndim > 1:
+                boards = bitboard.to_bitboard_many(boards)
+            else:
+                boards = np.array([int(board) for board in boards], dtype=np.uint64)
+
+        cache = batch_search.EvaluationCache(self.evaluate_bitboards)
+        scores = np.empty(len(boards))
+        best = np.empty(len(boards), dtype=np.int64)
+
+        for start in range(0, len(boards), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            scores[chunk], best[chunk] = self._search_many(boards[chunk], depth, True, cache=cache)
+
+        self._eval_cache_hits += cache.hits
+        self._eval_cache_misses += cache.misses
+
+        # Like _search_root: a board without moves scores -inf and plays 'left'.
+        scores[best < 0] = -np.inf
+        moves = np.array(batch_search.MOVES)[np.maximum(best, 0)]
+
+        return scores, moves
+
+    def _search_many(self, boards, depth, is_maximizing, probs=None, cache=None):
+        # Expectimax over a uint64 array of nodes, one ply at a time: every
+        # level is expanded into one array, all boards that need a static
+        # evaluation are scored through the cache in one pass, and the values
+        # are reduced back up. Returns the node values and, for max nodes, the
+        # index of the best move (-1 without moves).
+        if probs is None:
+            probs = np.ones(len(boards))
+        if cache is None:
+            cache = batch_search.EvaluationCache(self.evaluate_bitboards)
+
+        levels = []
+        static = []
+        static_count = 0
+
+        nodes, node_probs = boards, probs
+        while True:
+            inverse = None
+            if len(nodes) > 1 and batch_search.cutoff_free(
+                    depth, is_maximizing, node_probs.min(), self._prob_cutoff):
+                nodes, index, inverse = np.unique(nodes, return_index=True, return_inverse=True)
+                node_probs = node_probs[index]
+
+            if levels:
+                self._nodes += len(nodes)
+
+            level = {'is_max': is_maximizing, 'count': len(nodes), 'inverse': inverse}
+            levels.append(level)
+
+            if depth == 0:
+                level['leaf_at'] = static_count
+                static.append(nodes)
+                static_count += len(nodes)
+                break
+
+            if is_maximizing:
+                children, slots, fallback = batch_search.expand_max(nodes)
+                child_probs = node_probs[slots // 4]
+                cut = np.zeros(len(children), dtype=bool)
+            else:
+                children, child_probs, slots, counts = batch_search.expand_chance(nodes, node_probs)
+                fallback = counts == 0
+                level['counts'] = counts
+                if depth - 1 > 0:
+                    cut = child_probs < self._prob_cutoff
+                else:
+                    cut = np.zeros(len(children), dtype=bool)
+                self._cutoffs += int(cut.sum())
+
+            # Nodes without children and cut children get a static evaluation.
+            level.update(slots=slots, fallback=fallback, cut=cut, static_at=static_count)
+            static += [nodes[fallback], children[cut]]
+            static_count += int(fallback.sum()) + int(cut.sum())
+
+            if self._deadline is not None and time.perf_counter() > self._deadline:
+                raise SearchTimeout()
+
+            nodes, node_probs = children[~cut], child_probs[~cut]
+            is_maximizing = not is_maximizing
+            depth -= 1
+
+        # Symmetric leaves share one cache entry. Merging symmetric inner nodes
+        # as well costs more in canonicalization than it saves.
+        static = np.concatenate(static)
+        if self._canonical_keys:
+            static = bitboard.canonical_many(static)
+        static_values = cache.evaluate(static)
+
+        leaf = levels[-1]
+        values = static_values[leaf['leaf_at']:leaf['leaf_at'] + leaf['count']]
+        best = None
+
+        for k in range(len(levels) - 1, -1, -1):
+            level = levels[k]
+
+            if k < len(levels) - 1:
+                at = level['static_at']
+                fallbacks = int(level['fallback'].sum())
+                cut = level['cut']
+
+                child_values = np.empty(len(cut))
+                child_values[~cut] = values
+                child_values[cut] = static_values[at + fallbacks:at + fallbacks + int(cut.sum())]
+
+                if level['is_max']:
+                    values, moves = batch_search.reduce_max(level['count'], level['slots'], child_values)
+                    if k == 0:
+                        best = np.where(level['fallback'], -1, moves)
+                else:
+                    values = batch_search.reduce_chance(
+                        level['count'], level['slots'], child_values, level['counts'])
+
+                values[level['fallback']] = static_values[at:at + fallbacks]
+
+            # Back from merged nodes to the entries of the level above.
+            if level['inverse'] is not None:
+                values = values[level['inverse']]
+                if best is not None:
+                    best = best[level['inverse']]
+
+        return values, best
+
+    def iterative_deepening(self, board, time_budget, max_depth=12):
+        board = bitboard.as_bitboard(board)
+
+        start_time = time.perf_counter()
+        deadline = start_time + time_budget
+
+        best_score, best_move = self._search_root(board, 1)
+        best_depth = 1
+        last_duration = time.perf_counter() - start_time
+
+        for depth in range(2, max_depth + 1):
+            iteration_start = time.perf_counter()
+
+            # The next iteration is always slower than the last one, so do not
+            # start it when it has no chance to finish inside the budget.
+            if deadline - iteration_start < last_duration:
+                break
+
+            # The previous best move is searched first: if the iteration runs
+            # out of time after it, the moves finished at the new depth are
+            # still compared, since any that beat it there is better informed.
+            self._deadline = deadline
+            try:
+                score, move = self._search_root(board, depth, best_move)
+            except SearchTimeout:
+                if best_move in self._root_scores:
+                    best_score, best_move = self._pick_root_move(self._root_scores)
+                break
+            finally:
+                self._deadline = None
+
+            best_score, best_move, best_depth = score, move, depth
+            last_duration = time.perf_counter() - iteration_start
+
+        self._last_depth = best_depth
+
+        return best_score, best_move, best_depth
+
+    def _search_root(self, board, depth, first_move=None):
+        # Scores of the root moves searched so far, for a search cut short.
+        self._root_scores = {}
+
+        if self._workers > 1 and depth >= 3:
+            return self._search_root_parallel(board, depth)
+
+        # The whole tree is one batch: smaller batches lose more to NumPy call
+        # overhead than they save.
+        if self._batch_search:
+            values, best = self._search_many(np.array([board], dtype=np.uint64), depth, True)
+            if best[0] < 0:
+                return -float('inf'), 'left'
+            return float(values[0]), batch_search.MOVES[best[0]]
 
-        score += self._mergeability(board) * 50
-        score -= self._isolation_penalty(board) * 10
+        moves = ['left', 'right', 'up', 'down']
+        if first_move is not None:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
 
-        return score
+        for move in moves:
+            new_board, moved = self.simulate_move(board, move)
+            if not moved:
+                continue
+
+            self._root_scores[move] = self._expectimax(new_board, depth-1, False)
 
-    def _monotonicity(self, board):
-        mono = 0
-
-        for i in range(4):
-            for j in range(3):
-                current = math.log2(board[i, j]) if board[i, j] > 0 else 0
-                next_val = math.log2(board[i, j+1]) if board[i, j+1] > 0 else 0
-                if current > next_val:
-                    mono += 1
-                elif current < next_val:
-                    mono -= 1
-
-        for j in range(4):
-            for i in range(3):
-                current = math.log2(board[i, j]) if board[i, j] > 0 else 0
-                next_val = math.log2(board[i+1, j]) if board[i+1, j] > 0 else 0
-                if current > next_val:
-                    mono += 1
-                elif current < next_val:
-                    mono -= 1
-
-        return abs(mono)
-
-    def _mergeability(self, board):
-        merges = 0
-
-        for i in range(4):
-            for j in range(4):
-                if board[i, j] == 0:
-                    continue
-
-                for dx, dy in [(0, 1), (1, 0)]:
-                    ni, nj = i + dx, j + dy
-                    if 0 <= ni < 4 and 0 <= nj < 4 and board[ni, nj] == board[i, j]:
-                        merges += 1
-
-        return merges
-
-    def _isolation_penalty(self, board):
-        penalty = 0
-
-        for i in range(4):
-            for j in range(4):
-                if board[i, j] > 0:
-                    has_similar_neighbor = False
-                    for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                        ni, nj = i + dx, j + dy
-                        if 0 <= ni < 4 and 0 <= nj < 4:
-                            if board[ni, nj] == board[i, j]:
-                                has_similar_neighbor = True
-                                break
-
-                    if not has_similar_neighbor and board[i, j] >= 8:
-                        penalty += 1
-
-        return penalty
-
-    def simulate_move(self, board, direction):
-        return super().simulate_move(board, direction)
-
-    def find_best_move(self, board, next_tile=None, depth=3):
+        return self._pick_root_move(self._root_scores)
+
+    def _pick_root_move(self, scores):
+        # Ties go to the first move in the usual order, whatever order the
+        # moves were searched in.
         best_score = -float('inf')
         best_move = 'left'
 
-        moves = ['left', 'right', 'up', 'down']
+        for move in ['left', 'right', 'up', 'down']:
+            if move in scores and scores[move] > best_score:
+                best_score = scores[move]
+                best_move = move
 
-        for move in moves:
+        return best_score, best_move
+
+    def _search_root_parallel(self, board, depth):
+        # Splits the search at the first chance layer: every spawn after every
+        # root move is one task. Scores are combined in the same order and with
+        # the same arithmetic as _search_node, so the result matches the serial search.
+        if self._parallel is None:
+            self._parallel = ParallelSearch(self, self._workers)
+
+        root_moves = []
+        tasks = []
+
+        for move in ['left', 'right', 'up', 'down']:
             new_board, moved = self.simulate_move(board, move)
             if not moved:
                 continue
 
-            expected_score = self._expectimax(new_board, depth-1, False)
+            empty_cells = self._get_empty_cells(new_board)
+            root_moves.append((move, len(empty_cells)))
+            cell_prob = 1.0 / len(empty_cells)
+
+            for cell in empty_cells:
+                for tile_exponent, tile_prob in [(1, 0.9), (2, 0.1)]:
+                    child = bitboard.place_tile(new_board, cell[0], cell[1], tile_exponent)
+                    tasks.append((child, depth - 2, cell_prob * tile_prob, self._deadline))
+
+        results = self._parallel.map(tasks)
+
+        for _, nodes, cutoffs in results:
+            self._nodes += nodes
+            self._cutoffs += cutoffs
+
+        if any(score is None for score, _, _ in results):
+            raise SearchTimeout()
+
+        best_score = -float('inf')
+        best_move = 'left'
+        index = 0
+
+        for move, empty_count in root_moves:
+            self._nodes += 1
+            expected_score = 0
+
+            for _ in range(empty_count):
+                for _, tile_prob in [(1, 0.9), (2, 0.1)]:
+                    expected_score += results[index][0] * tile_prob
+                    index += 1
+
+            expected_score = expected_score / empty_count
 
             if expected_score > best_score:
                 best_score = expected_score
@@ -116,9 +458,86 @@ class SimpleStrategy(BaseStrategy):
 
         return best_score, best_move
 
-    def _expectimax(self, board, depth, is_maximizing):
+    def _run_worker_task(self, task):
+        board, depth, prob, deadline = task
+
+        self._deadline = deadline
+        try:
+            score = self._search_chance_child(board, depth, prob)
+        except SearchTimeout:
+            score = None
+        finally:
+            self._deadline = None
+
+        nodes, cutoffs = self._nodes, self._cutoffs
+        self._nodes = 0
+        self._cutoffs = 0
+
+        return score, nodes, cutoffs
+
+    def _evaluate_bitboard(self, board):
+        features = row_heuristics.board_features(board)
+
+        if row_heuristics.has_win_tile(features):
+            return 1000000
+
+        mask = bitboard.ROW_MASK
+        positional = self._positional_tables
+
+        score = (
+            positional[0][board & mask]
+            + positional[1][(board >> 16) & mask]
+            + positional[2][(board >> 32) & mask]
+            + positional[3][(board >> 48) & mask]
+        ) * 2.0
+        score += abs(row_heuristics.monotonicity(features)) * 1.5
+
+        free_cells = row_heuristics.empty_cells(features)
+        if free_cells == 0:
+            score -= 10000
+        else:
+            score += _FREE_CELL_BONUS[free_cells]
+
+        score += row_heuristics.merges(features) * 50
+        score -= row_heuristics.isolated_tiles(features) * 10
+
+        return score
+
+    def _expectimax(self, board, depth, is_maximizing, prob=1.0):
+        self._nodes += 1
+
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
         if depth == 0:
-            return self.evaluate_position(board)
+            return self._evaluate_bitboard(board)
+
+        if self._tt is None:
+            return self._search_node(board, depth, is_maximizing, prob)
+
+        key = TranspositionTable.make_key(
+            bitboard.canonical(board) if self._canonical_keys else board, is_maximizing)
+        score = self._tt.get(key, depth, prob)
+
+        if score is None:
+            cutoffs = self._cutoffs
+            score = self._search_node(board, depth, is_maximizing, prob)
+
+            # Subtrees cut short by the probability threshold depend on the path
+            # probability and are not stored; a hit is never shallower than the
+            # search it replaces.
+            if self._cutoffs == cutoffs:
+                self._tt.put(key, score, depth, prob)
+
+        return score
+
+    def _search_node(self, board, depth, is_maximizing, prob):
+        if self._batch_search:
+            # Only reached at the top of a parallel task: its whole subtree is
+            # expanded into arrays and scored in one evaluate_bitboards call.
+            values, _ = self._search_many(
+                np.array([board], dtype=np.uint64), depth, is_maximizing, np.array([prob]))
+            return float(values[0])
 
         if is_maximizing:
             max_score = -float('inf')
@@ -126,37 +545,40 @@ class SimpleStrategy(BaseStrategy):
             for move in ['left', 'right', 'up', 'down']:
                 new_board, moved = self.simulate_move(board, move)
                 if moved:
-                    score = self._expectimax(new_board, depth-1, False)
+                    score = self._expectimax(new_board, depth-1, False, prob)
                     max_score = max(max_score, score)
 
-            return max_score if max_score != -float('inf') else self.evaluate_position(board)
+            return max_score if max_score != -float('inf') else self._evaluate_bitboard(board)
 
         else:
             empty_cells = self._get_empty_cells(board)
 
             if not empty_cells:
-                return self.evaluate_position(board)
+                return self._evaluate_bitboard(board)
 
             expected_score = 0
-            total_prob = 0
+            cell_prob = prob / len(empty_cells)
 
-            evaluated_cells = min(3, len(empty_cells))
+            for cell in empty_cells:
+                for tile_exponent, tile_prob in [(1, 0.9), (2, 0.1)]:
+                    new_board = bitboard.place_tile(board, cell[0], cell[1], tile_exponent)
+                    score = self._search_chance_child(new_board, depth-1, cell_prob * tile_prob)
+                    expected_score += score * tile_prob
 
-            for i in range(evaluated_cells):
-                cell = empty_cells[i]
+            return expected_score / len(empty_cells)
 
-                for tile_value, prob in [(2, 0.9), (4, 0.1)]:
-                    new_board = board.copy()
-                    new_board[cell[0], cell[1]] = tile_value
+    def _search_chance_child(self, board, depth, prob):
+        if depth > 0 and prob < self._prob_cutoff:
+            self._cutoffs += 1
+            return self._evaluate_bitboard(board)
 
-                    score = self._expectimax(new_board, depth-1, True)
-                    expected_score += score * prob
-                    total_prob += prob
-
-            return expected_score / total_prob if total_prob > 0 else self.evaluate_position(board)
+        return self._expectimax(board, depth, True, prob)
 
     def _get_empty_cells(self, board):
-        empty_cells = [(i, j) for i in range(4) for j in range(4) if board[i, j] == 0]
+        if bitboard.is_packed(board):
+            empty_cells = bitboard.get_empty_cells(int(board))
+        else:
+            empty_cells = [(i, j) for i in range(4) for j in range(4) if board[i, j] == 0]
         empty_cells.sort(key=lambda pos: (min(pos[0], 3-pos[0]) + min(pos[1], 3-pos[1])))
 
         return empty_cells
@@ -174,3 +596,7 @@ class SimpleStrategy(BaseStrategy):
     def find_aggressive_move(self, board):
         _, best_move = self.find_best_move(board, depth=2)
         return best_move
+
+
+class SearchTimeout(Exception):
+    pass
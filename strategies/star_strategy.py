@@ -0,0 +1,281 @@
+import time
+
+from strategies import bitboard, row_heuristics
+from strategies.simple_strategy import SimpleStrategy, SearchTimeout, _FREE_CELL_BONUS
+from strategies.transposition_table import TranspositionTable
+
+
+WIN_SCORE = 1000000
+
+# Most neighbour pairs that m occupied cells can form on the 4x4 grid.
+_MAX_GRID_PAIRS = [0, 0, 1, 2, 4, 5, 7, 8, 10, 12, 13, 15, 17, 18, 20, 22, 24]
+
+
+def _binary_tiles(total):
+    # The fewest and largest tiles with this sum: every board with the same tile
+    # sum can be merged down to it, and merging only pushes value into fewer cells.
+    return [1 << bit for bit in range(total.bit_length() - 1, -1, -1) if total >> bit & 1]
+
+
+def _merged_tiles(exponents, moves):
+    # Largest tiles, largest first, that these tiles can become in `moves`
+    # moves: every move merges each pair of equal tiles once, and a tile
+    # made by a merge waits for the next move.
+    counts = {}
+    for e in exponents:
+        counts[e] = counts.get(e, 0) + 1
+
+    for _ in range(moves):
+        merged = {}
+        for e, count in counts.items():
+            if count % 2:
+                merged[e] = merged.get(e, 0) + 1
+            if count // 2:
+                merged[e + 1] = merged.get(e + 1, 0) + count // 2
+        counts = merged
+
+    return [1 << e for e in sorted(counts, reverse=True) for _ in range(counts[e])]
+
+
+class StarStrategy(SimpleStrategy):
+    # Expectimax with Star1 pruning (Ballard's *-minimax) on top of the
+    # SimpleStrategy evaluation: a chance node stops expanding spawns as soon as
+    # the children seen so far plus the evaluation upper bound for the rest
+    # cannot beat the best move already found above it.
+    def __init__(self, debug=True, tt_size_mb=64, prob_cutoff=0.02, workers=0,
+                 move_cache_path=None, move_cache_entries=1000000, opening_book_path=None):
+        super().__init__(
+            debug, tt_size_mb, prob_cutoff, workers, move_cache_path=move_cache_path,
+            move_cache_entries=move_cache_entries, opening_book_path=opening_book_path)
+
+        weights = sorted(self._weights.ravel().tolist(), reverse=True)
+        self._weights_desc = weights
+        self._weights_asc = weights[::-1]
+        # Positional gain of the best spawn, a 2 or a 4, in every cell.
+        self._spawn_gains = [max(2 * w, 4 * w) for w in self._weights.ravel().tolist()]
+        self._bounds_cache = {}
+        self._pruned = 0
+
+    def new_game(self):
+        super().new_game()
+        # Keyed by the tiles on the board, which only grow during a game.
+        self._bounds_cache.clear()
+
+    def pop_search_stats(self):
+        stats = super().pop_search_stats()
+        stats['pruned_nodes'] = self._pruned
+        self._pruned = 0
+        return stats
+
+    def evaluation_bounds(self, board, spawns, moves=None):
+        # Bounds of _evaluate_bitboard over every board reachable from `board`
+        # with at most `moves` moves (any number when None) and `spawns` new
+        # tiles, term by term. Bounds from the tiles alone, not where they
+        # are, are shared by boards with the same tiles.
+        exponents = [(board >> shift) & 0xF for shift in bitboard._SHIFTS]
+
+        if max(exponents) >= row_heuristics.WIN_EXPONENT:
+            # Tiles never shrink, so every reachable board still has the win tile.
+            return WIN_SCORE, WIN_SCORE
+
+        key = (tuple(sorted(e for e in exponents if e)), spawns, moves)
+        bounds = self._bounds_cache.get(key)
+        if bounds is None:
+            bounds = self._bounds_cache[key] = self._compute_bounds(key[0], spawns, moves)
+
+        if moves == 0:
+            bounds = bounds[0], min(bounds[1], self._upper_without_moves(board, exponents, spawns))
+
+        return bounds
+
+    def _upper_without_moves(self, board, exponents, spawns):
+        # Without moves every tile stays where it is: the positional term only
+        # gains the best cells a spawn can fill, and a spawned 2 or 4 adds at
+        # most four equal neighbours and never pairs an isolated tile of 8 or more.
+        features = row_heuristics.board_features(board)
+        mask = bitboard.ROW_MASK
+        positional = self._positional_tables
+
+        gains = sorted((gain for gain, e in zip(self._spawn_gains, exponents) if e == 0 and gain > 0), reverse=True)
+        spawn_gain = sum(gains[:spawns])
+
+        score = (
+            positional[0][board & mask]
+            + positional[1][(board >> 16) & mask]
+            + positional[2][(board >> 32) & mask]
+            + positional[3][(board >> 48) & mask]
+            + spawn_gain
+        ) * 2.0
+        score += 8 * 3 * 1.5
+
+        free_cells = row_heuristics.empty_cells(features)
+        score += -10000 if free_cells == 0 else _FREE_CELL_BONUS[free_cells]
+
+        score += (row_heuristics.merges(features) + 4 * spawns) * 50
+        score -= row_heuristics.isolated_tiles(features) * 10
+
+        return score
+
+    def _compute_bounds(self, exponents, spawns, moves):
+        total = sum(1 << e for e in exponents)
+        tiles = len(exponents)
+        max_tiles = min(16, tiles + spawns)
+
+        # Moves keep the tile sum, every spawn adds 2 or 4.
+        positional_lower = float('inf')
+        for reachable_total in range(total, total + 4 * spawns + 1, 2):
+            values = _binary_tiles(reachable_total)
+            positional_lower = min(positional_lower, sum(v * w for v, w in zip(values, self._weights_asc)))
+
+        # Upper ends: every count and 2/4 mix of spawns, merged as far as the
+        # moves allow.
+        positional_upper = -float('inf')
+        min_tiles = max_tiles
+        wins = False
+        for spawned in range(spawns + 1):
+            for fours in range(spawned + 1):
+                reachable = list(exponents) + [2] * fours + [1] * (spawned - fours)
+                if moves is None:
+                    merged = _binary_tiles(sum(1 << e for e in reachable))
+                else:
+                    merged = _merged_tiles(reachable, moves)
+
+                positional_upper = max(positional_upper, sum(v * w for v, w in zip(merged, self._weights_desc)))
+                min_tiles = min(min_tiles, len(merged))
+                wins = wins or bool(merged) and merged[0] >= 1 << row_heuristics.WIN_EXPONENT
+
+        free_lower = -10000 if max_tiles == 16 else _FREE_CELL_BONUS[16 - max_tiles]
+        free_upper = -10000 if min_tiles == 16 else _FREE_CELL_BONUS[16 - max(min_tiles, 1)]
+
+        # Neighbour pairs only form between equal tiles. Any tile count a value
+        # can reach, merged or not, bounds the pairs of that value.
+        counts = [0] * 17
+        for e in exponents:
+            counts[e] += 1
+        counts[1] += spawns
+        counts[2] += spawns
+        for _ in range(16 if moves is None else moves):
+            counts = [counts[0]] + [counts[e] + counts[e - 1] // 2 for e in range(1, 17)]
+        max_merges = min(sum(_MAX_GRID_PAIRS[min(count, 16)] for count in counts), _MAX_GRID_PAIRS[max_tiles])
+
+        upper = positional_upper * 2.0 + 8 * 3 * 1.5 + free_upper + max_merges * 50
+        lower = positional_lower * 2.0 + free_lower - max_tiles * 10
+
+        if wins:
+            upper = max(upper, WIN_SCORE)
+
+        return lower, upper
+
+    def _ordered_moves(self, board, first_move=None):
+        # Likely best moves first raise alpha early: the best move of the
+        # previous iteration, then the best evaluated children. The order only
+        # changes which subtrees get cut, never a node value.
+        children = []
+        for index, move in enumerate(['left', 'right', 'up', 'down']):
+            new_board, moved = self.simulate_move(board, move)
+            if moved:
+                children.append((move != first_move, -self._evaluate_bitboard(new_board), index, move, new_board))
+        children.sort()
+        return [(move, new_board) for _, _, _, move, new_board in children]
+
+    def _search_root(self, board, depth, first_move=None):
+        if self._workers > 1 and depth >= 3:
+            return super()._search_root(board, depth, first_move)
+
+        self._root_scores = {}
+        best_score = -float('inf')
+
+        for move, new_board in self._ordered_moves(board, first_move):
+            expected_score = self._star(new_board, depth-1, False, 1.0, best_score)
+            self._root_scores[move] = expected_score
+            best_score = max(best_score, expected_score)
+
+        # Pruned moves come back strictly below alpha, so exact ties still
+        # go to the first move in the usual order, as in _search_root.
+        return self._pick_root_move(self._root_scores)
+
+    def _star(self, board, depth, is_maximizing, prob, alpha):
+        # Same tree and arithmetic as _expectimax. With a single player there is
+        # no finite upper window anywhere in the tree, so only fail-low cuts
+        # against alpha can happen. A result at or below alpha is only an upper
+        # bound: the caller discards it and it never enters the table.
+        self._nodes += 1
+
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        if depth == 0:
+            return self._evaluate_bitboard(board)
+
+        if self._tt is None:
+            return self._star_node(board, depth, is_maximizing, prob, alpha)
+
+        key = TranspositionTable.make_key(board, is_maximizing)
+        score = self._tt.get(key, depth, prob)
+
+        if score is None:
+            cutoffs = self._cutoffs
+            score = self._star_node(board, depth, is_maximizing, prob, alpha)
+
+            if self._cutoffs == cutoffs and score > alpha:
+                self._tt.put(key, score, depth, prob)
+
+        return score
+
+    def _star_node(self, board, depth, is_maximizing, prob, alpha):
+        if is_maximizing:
+            max_score = -float('inf')
+
+            for move in ['left', 'right', 'up', 'down']:
+                new_board, moved = self.simulate_move(board, move)
+                if moved:
+                    score = self._star(new_board, depth-1, False, prob, max(alpha, max_score))
+                    max_score = max(max_score, score)
+
+            return max_score if max_score != -float('inf') else self._evaluate_bitboard(board)
+
+        empty_cells = self._get_empty_cells(board)
+
+        if not empty_cells:
+            return self._evaluate_bitboard(board)
+
+        # Work in the unnormalised sum: the node value is expected_score / n.
+        n = len(empty_cells)
+        target = alpha * n
+        pruning = alpha != -float('inf')
+
+        if pruning:
+            _, upper = self.evaluation_bounds(board, (depth + 1) // 2, depth // 2)
+            tolerance = 1e-9 * (abs(upper) + abs(target) + 1)
+
+        expected_score = 0
+        remaining = float(n)
+        cell_prob = prob / n
+        children = 2 * n
+
+        for cell in empty_cells:
+            for tile_exponent, tile_prob in [(1, 0.9), (2, 0.1)]:
+                remaining -= tile_prob
+                children -= 1
+
+                new_board = bitboard.place_tile(board, cell[0], cell[1], tile_exponent)
+                child_prob = cell_prob * tile_prob
+
+                if depth - 1 > 0 and child_prob >= self._prob_cutoff:
+                    child_alpha = -float('inf')
+                    if pruning:
+                        child_alpha = (target - expected_score - remaining * upper - tolerance) / tile_prob
+
+                    score = self._star(new_board, depth-1, True, child_prob, child_alpha)
+                    failed_low = score <= child_alpha
+                else:
+                    score = self._search_chance_child(new_board, depth-1, child_prob)
+                    failed_low = False
+
+                expected_score += score * tile_prob
+
+                if pruning and (failed_low or expected_score + remaining * upper <= target - tolerance):
+                    self._pruned += children
+                    return min((expected_score + remaining * upper) / n, alpha)
+
+        return expected_score / n
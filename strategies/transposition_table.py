@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    # Approximate cost of one entry: OrderedDict slot, packed-board key and (score, depth, prob) tuple.
+    ENTRY_SIZE_BYTES = 248
+
+    def __init__(self, max_memory_mb=64):
+        self._max_memory_mb = max_memory_mb
+        self._max_entries = max(1, int(max_memory_mb * 1024 * 1024) // self.ENTRY_SIZE_BYTES)
+        self._entries = OrderedDict()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(board, is_maximizing):
+        return (board << 1) | int(is_maximizing)
+
+    def get(self, key, depth, prob=1.0):
+        # A result searched at least as deep is as good as a fresh search. It is
+        # only valid for paths at least as likely as the one it was searched on,
+        # otherwise probability cutoffs could have changed its score.
+        entry = self._entries.get(key)
+
+        if entry is None or entry[1] < depth or prob < entry[2]:
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+
+        return entry[0]
+
+    def put(self, key, score, depth, prob=1.0):
+        # Never trade a deeper result for a shallower one.
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= depth:
+            self._entries[key] = (score, depth, prob)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop_stats(self):
+        lookups = self._hits + self._misses
+
+        stats = {
+            'tt_hits': self._hits,
+            'tt_misses': self._misses,
+            'tt_evictions': self._evictions,
+            'tt_entries': len(self._entries)
+        }
+        if lookups > 0:
+            stats['tt_hit_rate'] = self._hits / lookups
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        return stats
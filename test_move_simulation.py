@@ -4,6 +4,7 @@ import time
 
 from datetime import datetime
 from board_parser import BoardParser
+from strategies import bitboard
 from strategies.base_strategy import BaseStrategy
 
 
@@ -51,9 +52,9 @@ class SimulationTester:
             desc = {
                 'move_number': move_number,
                 'direction': direction,
-                'board_before': board_before.tolist(),
-                'board_after': board_after.tolist(),
-                'simulated_board': simulated_board.tolist(),
+                'board_before': bitboard.decode_board(board_before).tolist(),
+                'board_after': bitboard.decode_board(board_after).tolist(),
+                'simulated_board': bitboard.decode_board(simulated_board).tolist(),
                 'changed': changed,
                 'timestamp': datetime.now().isoformat()
             }
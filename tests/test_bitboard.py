@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from strategies import bitboard
+
+
+def _reference_line_left(line):
+    # The grid engine the bitboard tables replaced, on tile values: like the
+    # emulator, a cell that has received a tile during this move cannot merge.
+    line = list(line)
+    moved = [False] * 4
+
+    i = 0
+    while i < 4:
+        if line[i] == 0:
+            for j in range(i + 1, 4):
+                if line[j] != 0:
+                    line[i] = line[j]
+                    line[j] = 0
+                    moved[i] = True
+
+                    if i > 0 and line[i] == line[i - 1] and not moved[i - 1]:
+                        line[i - 1] *= 2
+                        line[i] = 0
+                        moved[i - 1] = True
+                    else:
+                        i += 1
+                    break
+            else:
+                i += 1
+        else:
+            if i > 0 and line[i] == line[i - 1] and not moved[i - 1]:
+                line[i - 1] *= 2
+                line[i] = 0
+                moved[i - 1] = True
+            else:
+                i += 1
+
+    return line
+
+
+def _reference_move_left(grid):
+    return np.array([_reference_line_left(row) for row in grid])
+
+
+def _reference_game_over(grid):
+    if np.any(grid == 0):
+        return False
+
+    for i in range(4):
+        for j in range(3):
+            if grid[i, j] == grid[i, j + 1] or grid[j, i] == grid[j + 1, i]:
+                return False
+
+    return True
+
+
+def _reference_move(grid, direction):
+    if direction == 'left':
+        return _reference_move_left(grid)
+    if direction == 'right':
+        return np.fliplr(_reference_move_left(np.fliplr(grid)))
+    if direction == 'up':
+        return _reference_move_left(grid.T).T
+    return np.fliplr(_reference_move_left(np.fliplr(grid.T))).T
+
+
+def _random_grids(count, seed=0):
+    rng = np.random.default_rng(seed)
+    grids = rng.integers(1, 12, size=(count, 4, 4))
+    grids[rng.random((count, 4, 4)) < 0.4] = 0
+    # Rows of one repeated tile exercise chains of merges.
+    grids[::7, 0] = grids[::7, 0, :1]
+    return grids.astype(np.uint8)
+
+
+@pytest.mark.parametrize('direction', list(bitboard.MOVE_FUNCTIONS))
+def test_move_matches_grid_engine(direction):
+    for grid in _random_grids(500):
+        moved = bitboard.move(bitboard.to_bitboard(grid), direction)
+
+        np.testing.assert_array_equal(
+            bitboard.decode_board(bitboard.from_bitboard(moved)),
+            _reference_move(bitboard.decode_board(grid), direction))
+
+
+@pytest.mark.parametrize('direction', list(bitboard.MOVE_FUNCTIONS))
+def test_move_many_matches_move(direction):
+    boards = bitboard.to_bitboard_many(_random_grids(500))
+
+    expected = [bitboard.move(int(board), direction) for board in boards]
+
+    assert bitboard.move_many(boards, direction).tolist() == expected
+
+
+def test_is_game_over_matches_grid_engine():
+    rng = np.random.default_rng(1)
+    # Full boards of few distinct tiles, so both outcomes are common.
+    grids = rng.integers(1, 5, size=(500, 4, 4)).astype(np.uint8)
+    grids[::5, 3, 3] = 0
+
+    outcomes = [bitboard.is_game_over(bitboard.to_bitboard(grid)) for grid in grids]
+
+    assert outcomes == [_reference_game_over(grid) for grid in grids]
+    assert any(outcomes) and not all(outcomes)
+
+
+def test_transpose_matches_grid_transpose():
+    for grid in _random_grids(200):
+        transposed = bitboard.transpose(bitboard.to_bitboard(grid))
+
+        np.testing.assert_array_equal(bitboard.from_bitboard(transposed), grid.T)
+
+
+def test_packing_round_trips():
+    for grid in _random_grids(200):
+        np.testing.assert_array_equal(bitboard.from_bitboard(bitboard.to_bitboard(grid)), grid)
@@ -0,0 +1,64 @@
+import pytest
+
+from strategies.move_cache import MoveCache
+from strategies.opening_book import build_book, save_book
+from strategies.simple_strategy import SimpleStrategy
+
+
+# Packed board with five small tiles in its top-left corner.
+BOARD = 0x0000000100210012
+
+
+def test_move_cache_returns_stored_result(tmp_path):
+    cache = MoveCache(str(tmp_path / 'moves.sqlite'), 'a')
+    cache.put(BOARD, 3, 12.5, 'left')
+
+    assert cache.get(BOARD, 3) == (12.5, 'left')
+    assert cache.get(BOARD, 2) is None
+    cache.close()
+
+
+def test_move_cache_ignores_other_fingerprints(tmp_path):
+    path = str(tmp_path / 'moves.sqlite')
+    cache = MoveCache(path, 'a')
+    cache.put(BOARD, 3, 12.5, 'left')
+    cache.close()
+
+    other = MoveCache(path, 'b')
+    assert other.get(BOARD, 3) is None
+    other.close()
+
+
+def test_strategy_settings_change_the_fingerprint():
+    assert SimpleStrategy(debug=False).cache_fingerprint() == SimpleStrategy(debug=False).cache_fingerprint()
+    assert SimpleStrategy(debug=False, prob_cutoff=0.05).cache_fingerprint() != (
+        SimpleStrategy(debug=False).cache_fingerprint())
+
+
+def test_move_cache_is_not_shared_across_settings(tmp_path):
+    path = str(tmp_path / 'moves.sqlite')
+
+    strategy = SimpleStrategy(debug=False, move_cache_path=path)
+    strategy.find_best_move(BOARD, depth=2)
+    assert strategy.pop_search_stats()['move_cache_misses'] == 1
+    strategy.find_best_move(BOARD, depth=2)
+    assert strategy.pop_search_stats()['move_cache_hits'] == 1
+    strategy.close()
+
+    other = SimpleStrategy(debug=False, prob_cutoff=0.05, move_cache_path=path)
+    other.find_best_move(BOARD, depth=2)
+    stats = other.pop_search_stats()
+    assert stats['move_cache_misses'] == 1 and stats['move_cache_hits'] == 0
+    other.close()
+
+
+def test_opening_book_from_other_settings_is_rejected(tmp_path):
+    path = str(tmp_path / 'book.npz')
+    save_book(path, build_book(SimpleStrategy(debug=False), moves=1, depth=1))
+
+    strategy = SimpleStrategy(debug=False, opening_book_path=path)
+    assert len(strategy._get_opening_book()) > 0
+
+    other = SimpleStrategy(debug=False, prob_cutoff=0.05, opening_book_path=path)
+    with pytest.raises(ValueError):
+        other._get_opening_book()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from strategies import bitboard, ntuple_network
+from strategies.factory import STRATEGIES, create_strategy
+
+
+GRID = np.array([
+    [1, 2, 3, 0],
+    [4, 1, 0, 0],
+    [2, 0, 0, 1],
+    [0, 0, 0, 0]
+], dtype=np.uint8)
+
+PACKED = bitboard.to_bitboard(GRID)
+
+
+@pytest.fixture(scope='module')
+def weights_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('ntuple') / 'weights.npy')
+    weights = ntuple_network.create_weights(path)
+    weights[:] = np.random.default_rng(0).standard_normal(weights.shape, dtype=np.float32)
+    weights.flush()
+    return path
+
+
+@pytest.fixture(params=sorted(STRATEGIES))
+def strategy(request, weights_path):
+    strategy = create_strategy(
+        request.param, debug=False, weights_path=weights_path, playouts=16, seed=0)
+    yield strategy
+    strategy.close()
+
+
+def _board_forms():
+    return [GRID, PACKED, np.uint64(PACKED)]
+
+
+def test_evaluate_position_accepts_every_board_form(strategy):
+    scores = []
+    for board in _board_forms():
+        strategy.new_game()
+        scores.append(strategy.evaluate_position(board))
+
+    assert scores[0] == pytest.approx(scores[1])
+    assert scores[0] == pytest.approx(scores[2])
+
+
+def test_find_best_move_accepts_every_board_form(strategy):
+    results = []
+    for board in _board_forms():
+        strategy.new_game()
+        results.append(strategy.find_best_move(board, depth=2))
+
+    assert results[0] == results[1] == results[2]
+
+
+def test_simulate_move_accepts_every_board_form(strategy):
+    for direction in bitboard.MOVE_FUNCTIONS:
+        results = [strategy.simulate_move(board, direction) for board in _board_forms()]
+
+        assert {bitboard.as_bitboard(new_board) for new_board, _ in results} == {
+            bitboard.move(PACKED, direction)}
+        assert len({moved for _, moved in results}) == 1
+
+
+def test_is_game_over_accepts_every_board_form(strategy):
+    assert [strategy.is_game_over(board) for board in _board_forms()] == [False] * 3
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from strategies import bitboard
+from strategies.improved_strategy import ImprovedStrategy
+from strategies.simple_strategy import SimpleStrategy
+
+
+def _random_boards(count, seed=0):
+    rng = np.random.default_rng(seed)
+    grids = rng.integers(0, 14, size=(count, 4, 4))
+    grids[rng.random((count, 4, 4)) < 0.4] = 0
+    return bitboard.to_bitboard_many(grids.astype(np.uint8))
+
+
+@pytest.mark.parametrize('strategy_class', [SimpleStrategy, ImprovedStrategy])
+def test_single_board_evaluation_matches_batched(strategy_class):
+    strategy = strategy_class(debug=False)
+    boards = _random_boards(2000)
+
+    batched = strategy.evaluate_bitboards(boards)
+    single = [strategy._evaluate_bitboard(int(board)) for board in boards]
+
+    assert single == pytest.approx(batched, rel=1e-12)
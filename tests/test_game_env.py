@@ -0,0 +1,36 @@
+from game_env import GameEnvironment
+
+
+MOVES = ['left', 'up', 'right', 'down']
+
+
+def _play(env, moves=200):
+    boards = [env.get_bitboard()]
+
+    for k in range(moves):
+        if env.is_game_over():
+            break
+        # The first direction that changes the board, starting from a rotating one.
+        for offset in range(4):
+            if env.move(MOVES[(k + offset) % 4]):
+                break
+        boards.append(env.get_bitboard())
+
+    return boards
+
+
+def test_same_seed_replays_the_same_game():
+    assert _play(GameEnvironment(seed=7)) == _play(GameEnvironment(seed=7))
+
+
+def test_reset_with_seed_replays_the_game():
+    env = GameEnvironment(seed=7)
+    first = _play(env)
+
+    env.reset(seed=7)
+
+    assert _play(env) == first
+
+
+def test_different_seeds_spawn_differently():
+    assert _play(GameEnvironment(seed=7)) != _play(GameEnvironment(seed=8))
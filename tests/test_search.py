@@ -0,0 +1,71 @@
+import pytest
+
+from game_env import GameEnvironment
+from strategies.factory import create_strategy
+
+
+# Each mode must reproduce plain expectimax: no transposition table, serial,
+# one node at a time.
+SEARCH_MODES = {
+    'transposition_table': ('simple', {}),
+    'batched': ('simple', {'batch_search': True}),
+    'parallel': ('simple', {'workers': 2}),
+    'star': ('star', {}),
+}
+
+
+def _positions(count=8, stride=15):
+    env = GameEnvironment(seed=3)
+    player = create_strategy('simple', debug=False, tt_size_mb=0)
+    positions = []
+
+    while not env.is_game_over() and len(positions) < count:
+        board = env.get_board()
+        if env.get_move_count() % stride == 0:
+            positions.append(board)
+
+        _, direction = player.find_best_move(board, depth=1)
+        env.move(direction)
+
+    return positions
+
+
+@pytest.fixture(scope='module')
+def positions():
+    return _positions()
+
+
+@pytest.fixture(scope='module')
+def plain():
+    return create_strategy('simple', debug=False, tt_size_mb=0)
+
+
+@pytest.mark.parametrize('mode', list(SEARCH_MODES))
+@pytest.mark.parametrize('depth', [2, 3])
+def test_search_mode_matches_plain_expectimax(mode, depth, positions, plain):
+    name, options = SEARCH_MODES[mode]
+    strategy = create_strategy(name, debug=False, **options)
+
+    try:
+        for board in positions:
+            expected_score, expected_move = plain.find_best_move(board, depth=depth)
+
+            # A fresh table: one kept from earlier moves may hold deeper results.
+            strategy.new_game()
+            score, move = strategy.find_best_move(board, depth=depth)
+
+            assert move == expected_move
+            assert score == pytest.approx(expected_score, rel=1e-9)
+    finally:
+        strategy.close()
+
+
+def test_find_best_moves_matches_find_best_move(positions, plain):
+    strategy = create_strategy('simple', debug=False)
+
+    scores, moves = strategy.find_best_moves(positions, depth=3)
+
+    for board, score, move in zip(positions, scores, moves):
+        expected_score, expected_move = plain.find_best_move(board, depth=3)
+        assert move == expected_move
+        assert score == pytest.approx(expected_score, rel=1e-9)
@@ -0,0 +1,252 @@
+import argparse
+import json
+import multiprocessing
+import numpy as np
+import os
+import random
+import time
+
+from datetime import datetime
+from strategies import bitboard, ntuple_network
+from strategies.ntuple_strategy import DEFAULT_WEIGHTS_PATH
+
+
+MOVES = ['left', 'right', 'up', 'down']
+
+_worker = None
+
+
+class _TrainingWorker:
+    # Plays TD(0) afterstate self-play games against the shared memory-mapped
+    # weights. Updates are collected locally and added to the shared tables
+    # under a lock every `merge_every` games, so the hot loop never waits on
+    # other processes.
+    def __init__(self, weights_path, learning_rate, merge_every, lock):
+        self._weights = ntuple_network.load_weights(weights_path, writable=True)
+        self._flat_weights = np.asarray(self._weights).reshape(-1)
+        self._learning_rate = learning_rate / ntuple_network.FEATURES
+        self._merge_every = merge_every
+        self._lock = lock
+        self._deltas = {}
+
+    def _values(self, indices):
+        values = self._flat_weights[indices].sum(axis=1, dtype=np.float64).tolist()
+        if self._deltas:
+            deltas = self._deltas
+            for k, row in enumerate(indices.tolist()):
+                values[k] += sum(deltas.get(index, 0.0) for index in row)
+        return values
+
+    def _update(self, indices, error):
+        step = self._learning_rate * error
+        deltas = self._deltas
+        for index in indices.tolist():
+            deltas[index] = deltas.get(index, 0.0) + step
+
+    def merge(self):
+        if not self._deltas:
+            return
+
+        indices = np.fromiter(self._deltas.keys(), dtype=np.int64, count=len(self._deltas))
+        values = np.fromiter(self._deltas.values(), dtype=np.float64, count=len(self._deltas))
+
+        with self._lock:
+            self._flat_weights[indices] += values.astype(np.float32)
+
+        self._deltas.clear()
+
+    def play_game(self, seed):
+        # Moves are chosen greedily on reward + V(afterstate); V(afterstate) is
+        # moved towards the next reward + V(next afterstate), and to 0 at the end.
+        rng = random.Random(seed)
+        board = _spawn(_spawn(0, rng), rng)
+
+        previous = None
+        score = 0
+        moves = 0
+
+        while True:
+            afters = []
+            rewards = []
+            for direction in MOVES:
+                after = bitboard.move(board, direction)
+                if after != board:
+                    afters.append(after)
+                    rewards.append(bitboard.move_score(board, direction))
+
+            if not afters:
+                break
+
+            # All afterstates of the position are looked up in one gather.
+            indices = ntuple_network.feature_indices(
+                np.array([ntuple_network.board_exponents(after) for after in afters]))
+            values = self._values(indices)
+
+            best = max(range(len(afters)), key=lambda k: rewards[k] + values[k])
+            reward, value = rewards[best], values[best]
+
+            if previous is not None:
+                self._update(previous[1], reward + value - previous[0])
+
+            previous = (value, indices[best])
+            score += reward
+            moves += 1
+            board = _spawn(afters[best], rng)
+
+        if previous is not None:
+            self._update(previous[1], -previous[0])
+
+        return {
+            'score': score,
+            'moves': moves,
+            'max_tile': bitboard.tile_value(bitboard.get_max_exponent(board))
+        }
+
+    def play_batch(self, seeds):
+        results = []
+        for count, seed in enumerate(seeds, 1):
+            results.append(self.play_game(seed))
+            if count % self._merge_every == 0:
+                self.merge()
+        self.merge()
+        return results
+
+
+def _spawn(board, rng):
+    # Same spawn rule as GameEnvironment: 2 (90%) or 4 (10%) on a random empty cell.
+    i, j = rng.choice(bitboard.get_empty_cells(board))
+    return bitboard.place_tile(board, i, j, 2 if rng.random() < 0.1 else 1)
+
+
+def _init_worker(weights_path, learning_rate, merge_every, lock):
+    global _worker
+    _worker = _TrainingWorker(weights_path, learning_rate, merge_every, lock)
+
+
+def _play_batch(seeds):
+    return _worker.play_batch(seeds)
+
+
+def _metadata_path(weights_path):
+    return os.path.splitext(weights_path)[0] + '.json'
+
+
+def load_progress(weights_path):
+    path = _metadata_path(weights_path)
+    if not os.path.exists(path):
+        return {'games': 0, 'updates': 0, 'training_time': 0.0}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(weights, weights_path, progress):
+    weights.flush()
+
+    path = _metadata_path(weights_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def train(weights_path=DEFAULT_WEIGHTS_PATH, games=10000, processes=None, learning_rate=0.1,
+          batch_size=50, merge_every=10, checkpoint_every=1000, seed=0, resume=True, log_func=print):
+    if resume and os.path.exists(weights_path):
+        weights = ntuple_network.load_weights(weights_path, writable=True)
+        progress = load_progress(weights_path)
+        log_func(f"Resuming {weights_path} after {progress['games']} games")
+    else:
+        weights = ntuple_network.create_weights(weights_path)
+        progress = {'games': 0, 'updates': 0, 'training_time': 0.0}
+
+    progress.update({'learning_rate': learning_rate, 'seed': seed, 'tuples': ntuple_network.TUPLES})
+
+    # Game g always uses seed + g, so a resumed run continues the same sequence.
+    first_game = progress['games']
+    batches = [
+        list(range(seed + start, seed + min(start + batch_size, first_game + games)))
+        for start in range(first_game, first_game + games, batch_size)
+    ]
+
+    lock = multiprocessing.Lock()
+    start_time = time.perf_counter()
+    first_updates = progress['updates']
+    previous_time = progress['training_time']
+    last_checkpoint = first_game
+    window = []
+
+    with multiprocessing.Pool(
+        processes=processes,
+        initializer=_init_worker,
+        initargs=(weights_path, learning_rate, merge_every, lock)
+    ) as pool:
+        for results in pool.imap_unordered(_play_batch, batches):
+            window.extend(results)
+            progress['games'] += len(results)
+            progress['updates'] += sum(result['moves'] for result in results)
+
+            if progress['games'] - last_checkpoint < checkpoint_every and progress['games'] < first_game + games:
+                continue
+
+            elapsed = time.perf_counter() - start_time
+            progress['training_time'] = previous_time + elapsed
+            progress['games_per_sec'] = (progress['games'] - first_game) / elapsed
+            progress['updates_per_sec'] = (progress['updates'] - first_updates) / elapsed
+            progress['mean_score'] = sum(result['score'] for result in window) / len(window)
+            progress['reach_2048_rate'] = sum(1 for result in window if result['max_tile'] >= 2048) / len(window)
+
+            save_checkpoint(weights, weights_path, progress)
+            log_func(
+                f"Games {progress['games']} | {progress['games_per_sec']:.1f} games/s | "
+                f"{progress['updates_per_sec']:.0f} updates/s | mean score {progress['mean_score']:.0f} | "
+                f"2048 rate {progress['reach_2048_rate'] * 100:.1f}%"
+            )
+
+            last_checkpoint = progress['games']
+            window = []
+
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train n-tuple weights by TD(0) self-play')
+    parser.add_argument(
+        '-w', '--weights', default=DEFAULT_WEIGHTS_PATH,
+        help=f'Weights file, created if missing (default: {DEFAULT_WEIGHTS_PATH})')
+    parser.add_argument(
+        '-g', '--games', type=int, default=10000,
+        help='Games to play in this run (default: 10000)')
+    parser.add_argument(
+        '-j', '--processes', type=int, default=None,
+        help='Worker processes (default: all cores)')
+    parser.add_argument(
+        '--learning-rate', type=float, default=0.1,
+        help='TD learning rate, shared by all weights of a position (default: 0.1)')
+    parser.add_argument(
+        '--batch-size', type=int, default=50,
+        help='Games per worker task (default: 50)')
+    parser.add_argument(
+        '--merge-every', type=int, default=10,
+        help='Games between merges of local updates into the shared tables (default: 10)')
+    parser.add_argument(
+        '--checkpoint-every', type=int, default=1000,
+        help='Games between checkpoints (default: 1000)')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Spawn seed of the first game (default: 0)')
+    parser.add_argument(
+        '--fresh', action='store_true',
+        help='Start from zero weights even if the weights file exists')
+
+    args = parser.parse_args()
+
+    print(f'=== N-TUPLE TRAINING ({datetime.now()}) ===')
+    train(
+        weights_path=args.weights, games=args.games, processes=args.processes,
+        learning_rate=args.learning_rate, batch_size=args.batch_size, merge_every=args.merge_every,
+        checkpoint_every=args.checkpoint_every, seed=args.seed, resume=not args.fresh)
+
+
+if __name__ == '__main__':
+    main()